@@ -0,0 +1,43 @@
+from functools import lru_cache
+
+DEFAULT_CACHE_SIZE = 1 << 16
+
+
+class Analysis:
+    """
+    Everything the searchers and heuristics want to know about a board's legal moves, worked out once.
+    """
+    __slots__ = ('jumps', 'moves', 'peg_count', 'movable_pegs')
+
+    def __init__(self, geometry, pegs):
+        self.jumps = tuple(geometry.legal_jumps(pegs))
+        self.moves = tuple(geometry.jumps[index][0] for index in self.jumps)
+        self.peg_count = bin(pegs).count('1')
+        self.movable_pegs = len({source for source, _ in self.moves})
+
+
+def _analyse(geometry, pegs):
+    return Analysis(geometry, pegs)
+
+
+_cached_analyse = lru_cache(maxsize=DEFAULT_CACHE_SIZE)(_analyse)
+
+
+def analyse(geometry, pegs):
+    """
+    :return: the Analysis of the board with the given geometry and pegs, from an LRU cache shared by every board so
+    that transposed positions are only analysed once
+    """
+    return _cached_analyse(geometry, pegs)
+
+
+def set_cache_size(size):
+    """
+    Replaces the analysis cache with an empty one holding at most size boards (None for unbounded, 0 to disable).
+    """
+    global _cached_analyse
+    _cached_analyse = lru_cache(maxsize=size)(_analyse)
+
+
+def cache_info():
+    return _cached_analyse.cache_info()
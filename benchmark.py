@@ -0,0 +1,231 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import resource
+import signal
+import statistics
+import sys
+import time
+import tracemalloc
+
+import analysis
+import search
+from bitboard import BitBoard
+from board import Board
+
+METHODS = ['dfs', 'bfs', 'astar', 'idastar']
+HEURISTICS = ['max_moves', 'min_moves', 'max_movable_pegs', 'man']
+CHECKS = ['tree-search', 'graph-search', 'symmetry']
+
+# dfs and idastar keep no visited set, so duplication checks make no difference to them
+UNCHECKED_METHODS = {'dfs', 'idastar'}
+
+
+class Timeout(Exception):
+    pass
+
+
+def cases(inputs, methods, heuristics, checks):
+    """
+    Yields every (input file, duplication checks, method, heuristic) combination in the benchmark matrix.
+    """
+    for input_file in inputs:
+        for method in methods:
+            for check in (['tree-search'] if method in UNCHECKED_METHODS else checks):
+                for heuristic in (heuristics if 'star' in method else ['']):
+                    yield input_file, check, method, heuristic
+
+
+def run_case(case, options, repeat, warmup, timeout, trace_memory):
+    """
+    Times one case in a child process of its own, so that the peak RSS it reports is that case's alone: the high-water
+    mark of a process only ever grows, and would otherwise carry over from one case to the next.
+
+    :return: a JSON-ready dict of the case's results. Its status is 'ok', 'timeout' (some run went over timeout
+    seconds) or 'error'
+    """
+    connection, child_connection = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_case_process,
+                                      args=(child_connection, case, options, repeat, warmup, timeout, trace_memory))
+    process.start()
+    child_connection.close()
+    try:
+        result = connection.recv()
+    except EOFError:
+        result = None
+    process.join()
+    if result is None:
+        result = dict(_case_fields(case, options), status='error',
+                      error='the case process exited with code {}'.format(process.exitcode))
+    return result
+
+
+def _case_process(connection, *arguments):
+    connection.send(_run_case(*arguments))
+    connection.close()
+
+
+def _case_fields(case, options):
+    input_file, check, method, heuristic = case
+    return {'input': input_file, 'checks': check, 'method': method, 'heuristic': heuristic, 'options': options}
+
+
+def _run_case(case, options, repeat, warmup, timeout, trace_memory):
+    """
+    Times one case in this process; see run_case.
+    """
+    input_file, check, method, heuristic = case
+    argv = [input_file, check, method] + ([heuristic] if heuristic else []) + options
+    result = _case_fields(case, options)
+    args = search.parse_args(argv)
+    board_class = BitBoard if args.bitboard else Board
+
+    times = []
+    try:
+        for iteration in range(warmup + repeat + (1 if trace_memory else 0)):
+            start_board = board_class.board_from_file(input_file)
+            analysis.set_cache_size(args.analysis_cache)
+            tracing = trace_memory and iteration == warmup + repeat
+            if tracing:
+                # Read before tracing starts, since tracemalloc's own bookkeeping takes memory too
+                result['peak_rss'] = _peak_rss()
+                tracemalloc.start()
+
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+            try:
+                start = time.perf_counter()
+                run = search.solve(args, start_board)
+                elapsed = time.perf_counter() - start
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+
+            if tracing:
+                result['peak_allocated'] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            elif iteration >= warmup:
+                times.append(elapsed)
+    except Timeout:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        result['status'] = 'timeout'
+        return result
+    except Exception as error:
+        result['status'] = 'error'
+        result['error'] = '{}: {}'.format(type(error).__name__, error)
+        return result
+
+    median = statistics.median(times)
+    result.update(status='ok',
+                  times=times,
+                  median=median,
+                  steps=len(run.path) if run.path else None,
+                  nodes=run.seeker.nodes_visited,
+                  nodes_per_second=run.seeker.nodes_visited / median if median else None,
+                  peak_frontier=run.seeker.space,
+                  peak_rss=result.get('peak_rss') or _peak_rss())
+    return result
+
+
+def _peak_rss():
+    """
+    :return: the high-water mark of this process's resident set, in kilobytes on Linux
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def case_key(result):
+    return result['input'], result['checks'], result['method'], result['heuristic'], tuple(result['options'])
+
+
+def compare(results, baseline, tolerance, min_seconds=0.0):
+    """
+    :return: a description of every regression against baseline: a case that got slower than the baseline median by
+    more than tolerance (a fraction) and by more than min_seconds, visited more nodes, or stopped finishing. The
+    absolute floor keeps scheduler noise on cases that take a millisecond or two from counting as a regression
+    """
+    previous = {case_key(result): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get(case_key(result))
+        if old is None or old['status'] != 'ok':
+            continue
+        name = '{} {} {} {}'.format(*case_key(result)[:4])
+        if result['status'] != 'ok':
+            regressions.append('{}: {} (was ok)'.format(name, result['status']))
+            continue
+        if result['median'] - old['median'] > max(old['median'] * tolerance, min_seconds):
+            regressions.append('{}: {:.4f}s against {:.4f}s'.format(name, result['median'], old['median']))
+        if result['nodes'] > old['nodes']:
+            regressions.append('{}: {} nodes against {}'.format(name, result['nodes'], old['nodes']))
+    return regressions
+
+
+def _positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError('must be at least 1, got {}'.format(value))
+    return value
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the peg solitaire searches.')
+    parser.add_argument('--inputs', nargs='+', default=sorted(glob.glob('input_files/*.txt')),
+                        help='board files to run (defaults to every file in input_files)')
+    parser.add_argument('--methods', nargs='+', default=METHODS, help='search methods to run')
+    parser.add_argument('--heuristics', nargs='+', default=HEURISTICS, help='heuristics for astar and idastar')
+    parser.add_argument('--checks', nargs='+', default=CHECKS, help='duplication checks for bfs and astar')
+    parser.add_argument('--repeat', type=_positive_int, default=3, help='timed runs per case')
+    parser.add_argument('--warmup', type=int, default=1, help='untimed runs per case before the timed ones')
+    parser.add_argument('--timeout', type=float, default=10, help='seconds any single run may take')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip the extra run per case that measures peak allocation with tracemalloc')
+    parser.add_argument('--options', default='--bitboard',
+                        help='extra search.py options for every case, as one string')
+    parser.add_argument('--output', default='output_files/benchmark.json', help='where to write the results')
+    parser.add_argument('--baseline', default=None,
+                        help='results file to compare against; any regression makes the benchmark exit with status 1')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='fraction a median time may grow by before it counts as a regression')
+    parser.add_argument('--min-seconds', type=float, default=0.01,
+                        help='seconds a median time must also grow by before it counts as a regression')
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    options = args.options.split()
+
+    def on_alarm(signum, frame):
+        raise Timeout()
+    signal.signal(signal.SIGALRM, on_alarm)
+
+    results = []
+    for case in cases(args.inputs, args.methods, args.heuristics, args.checks):
+        result = run_case(case, options, args.repeat, args.warmup, args.timeout, not args.no_memory)
+        results.append(result)
+        if result['status'] == 'ok':
+            print('{:<24} {:<12} {:<8} {:<16} {:>10.4f}s {:>10} nodes {:>12.0f} nodes/s'.format(
+                *case, result['median'], result['nodes'], result['nodes_per_second'] or 0))
+        else:
+            print('{:<24} {:<12} {:<8} {:<16} {}'.format(*case, result['status']))
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({'python': sys.version, 'results': results}, f, indent=1)
+    print('Results have been saved to ' + args.output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_seconds)
+        if regressions:
+            print('Regressions against {}:'.format(args.baseline))
+            for regression in regressions:
+                print('  ' + regression)
+            sys.exit(1)
+        print('No regressions against ' + args.baseline)
+
+
+if __name__ == '__main__':
+    main()
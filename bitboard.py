@@ -0,0 +1,111 @@
+from analysis import analyse
+from board import Board, Spot
+from geometry import Geometry, load_board, parse_board
+
+
+class BitBoard:
+    """
+    A drop-in replacement for Board that keeps the pegs as a single integer bitmask over a shared Geometry.
+    """
+    __slots__ = ('geometry', 'pegs')
+
+    def __init__(self, geometry, pegs):
+        self.geometry = geometry
+        self.pegs = pegs
+
+    @classmethod
+    def board_from_file(cls, file_name):
+        return cls(*load_board(file_name))
+
+    @classmethod
+    def board_from_string(cls, text):
+        size, cells, pegs, directions = parse_board(text)
+        return cls(Geometry.get(size, cells, directions), pegs)
+
+    @classmethod
+    def board_from_board(cls, other):
+        return cls(other.geometry, other.pegs)
+
+    @classmethod
+    def from_board(cls, board):
+        """
+        :param board: a numpy backed Board
+        :return: the equivalent BitBoard
+        """
+        return cls(board.geometry, board.pegs)
+
+    def to_board(self):
+        return Board(self.board, list(self.geometry.directions))
+
+    @property
+    def size(self):
+        return self.geometry.size
+
+    @property
+    def directions(self):
+        return list(self.geometry.directions)
+
+    @property
+    def board(self):
+        """
+        The board as a numpy matrix of Spot values, for code that reads cells directly.
+        """
+        return Board.from_pegs(self.geometry, self.pegs).board
+
+    def get_symmetrically_equivalent_boards(self):
+        return [BitBoard(self.geometry, self.geometry.transform(self.pegs, symmetry))
+                for symmetry in range(1, len(self.geometry.symmetries))]
+
+    def key(self):
+        return self.pegs
+
+    def canonical_key(self):
+        return self.geometry.canonical(self.pegs)
+
+    def analysis(self):
+        return analyse(self.geometry, self.pegs)
+
+    def successors(self):
+        jumps = self.geometry.jumps
+        for index in self.analysis().jumps:
+            move, mask, _, _ = jumps[index]
+            yield (move, BitBoard(self.geometry, self.pegs ^ mask))
+
+    def check_peg(self, start_position, direction):
+        return self._get_spot(start_position, direction) == Spot.PEG
+
+    def check_free(self, start_position, direction):
+        return self._get_spot(start_position, direction) == Spot.FREE
+
+    def is_goal(self):
+        return self.pegs != 0 and self.pegs & (self.pegs - 1) == 0
+
+    def peg_count(self):
+        return bin(self.pegs).count('1')
+
+    def free_count(self):
+        return bin(self.geometry.cells & ~self.pegs).count('1')
+
+    def get_possible_moves(self):
+        yield from self.analysis().moves
+
+    def make_move(self, source, destination):
+        _, mask, _, _ = self.geometry.jumps[self.geometry.jump_index[(tuple(source), tuple(destination))]]
+        return BitBoard(self.geometry, self.pegs ^ mask)
+
+    def _get_spot(self, start_position, direction):
+        r, c = Board._adjusts_coords_to_direction(start_position, direction)
+        if not self.geometry._playable(r, c):
+            return '.'
+
+        return Spot.PEG if self.pegs & self.geometry._bit(r, c) else Spot.FREE
+
+    def __eq__(self, other):
+        return isinstance(other, BitBoard) and self.geometry is other.geometry and self.pegs == other.pegs
+
+    def __hash__(self):
+        return hash(self.pegs)
+
+    def __str__(self):
+        return str(self.to_board())
+
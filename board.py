@@ -1,7 +1,16 @@
 import sys
 from enum import IntEnum
 
-import numpy as np
+from analysis import analyse
+from geometry import DIRECTION_SETS, Geometry, cells_of, load_board, mask_of, parse_board
+from lazy import lazy_import
+
+# Only the interactive game needs the hint engine, and the solvers never load it
+hints = lazy_import('hints')
+np = lazy_import('numpy')
+
+# Row and column offsets of every direction string _adjusts_coords_to_direction has been asked about
+_OFFSETS = {}
 
 
 class Spot(IntEnum):
@@ -12,14 +21,10 @@ class Board:
     def __init__(self, board, directions):
         self.board = board
         self.size = board.shape[0]
+        self._geometry = None
 
         if type(directions) is str:
-            if directions == 'all':
-                self.directions = ['n', 'ne', 'e', 'se', 's', 'sw', 'w', 'nw']
-            elif directions == 'ortho':
-                self.directions = ['n', 'e', 's', 'w']
-            elif directions == 'swne':
-                self.directions = ['n', 'ne', 'e', 's', 'sw', 'w']
+            self.directions = list(DIRECTION_SETS[directions])
         else:
             self.directions = directions
 
@@ -30,34 +35,83 @@ class Board:
         :return: board_matrix: numpy character matrix
         :return: directions: string enumerating the directions travel is allowed
         """
-        with open(file_name, 'r') as peg_file:
-            directions, _, *matrix_lines = peg_file.readlines()
-
-        matrix = np.array([[spot for spot in line.strip().split(' ')] for line in matrix_lines])
+        return cls.from_pegs(*load_board(file_name))
 
-        board_matrix = np.zeros(matrix.shape, dtype=np.uint8)
-
-        for r in range(matrix.shape[0]):
-            for c in range(matrix.shape[1]):
-                if matrix[r, c] == '*':
-                    board_matrix[r, c] = int(Spot.PEG)
-                elif matrix[r, c] == 'o':
-                    board_matrix[r, c] = int(Spot.FREE)
-                else:
-                    board_matrix[r, c] = int(Spot.OUT_OF_BOUNDS)
+    @classmethod
+    def board_from_string(cls, text):
+        """
+        :param text: the contents of a board file
+        """
+        size, cells, pegs, directions = parse_board(text)
+        return cls.from_pegs(Geometry.get(size, cells, directions), pegs)
 
-        return Board(board=board_matrix, directions=directions.strip())
+    @classmethod
+    def from_pegs(cls, geometry, pegs):
+        """
+        :param pegs: bitmask of the cells holding a peg
+        :return: the board with those pegs on the given geometry
+        """
+        size = geometry.size
+        matrix = np.full(size * size, int(Spot.OUT_OF_BOUNDS), dtype=np.uint8)
+        matrix[cells_of(geometry.cells)] = Spot.FREE
+        matrix[cells_of(pegs)] = Spot.PEG
+        board = Board(matrix.reshape(size, size), list(geometry.directions))
+        board._geometry = geometry
+        return board
 
     @classmethod
     def board_from_board(cls, other):
         new_board = Board(np.copy(other.board), other.directions)
+        new_board._geometry = other._geometry
         return new_board
 
+    @property
+    def geometry(self):
+        """
+        The shared jump and symmetry tables for this board's shape and directions.
+        """
+        if self._geometry is None:
+            cells = mask_of(np.flatnonzero(self.board.ravel() != Spot.OUT_OF_BOUNDS))
+            self._geometry = Geometry.get(self.size, cells, self.directions)
+        return self._geometry
+
+    @property
+    def pegs(self):
+        """
+        Bitmask of the cells holding a peg, with cell (r, c) at bit r * size + c.
+        """
+        return mask_of(np.flatnonzero(self.board.ravel() == Spot.PEG))
+
     def get_symmetrically_equivalent_boards(self):
-        return [Board(np.rot90(np.copy(self.board), i), self.directions) for i in range(1, 4)]
+        """
+        :return: every other board reachable from this one by a reflection or rotation that keeps the board's shape and
+        direction set intact
+        """
+        geometry = self.geometry
+        boards = []
+        for symmetry in geometry.symmetries[1:]:
+            matrix = np.full(self.size * self.size, int(Spot.OUT_OF_BOUNDS), dtype=np.uint8)
+            matrix[symmetry] = self.board.ravel()
+            boards.append(Board(matrix.reshape(self.board.shape), self.directions))
+        return boards
+
+    def key(self):
+        return self.pegs
+
+    def canonical_key(self):
+        """
+        :return: a key shared by every board symmetrically equivalent to this one
+        """
+        return self.geometry.canonical(self.pegs)
+
+    def analysis(self):
+        """
+        :return: the cached Analysis (legal moves, peg count, movable pegs) of this board
+        """
+        return analyse(self.geometry, self.pegs)
 
     def successors(self):
-        moves = self.get_possible_moves()
+        moves = self.analysis().moves
         for move in moves:
             yield (move, self.make_move(*move))
 
@@ -72,26 +126,10 @@ class Board:
         Checks if the current board is in a goal state (IE there is only one pin left)
         :return: board_is_goal_state
         """
-        pegs = 0
-
-        for r in range(self.size):
-            for c in range(self.size):
-                if self.board[r, c] == Spot.PEG:
-                    pegs += 1
-
-                if pegs > 1:
-                    return False
-        return pegs == 1
+        return self.analysis().peg_count == 1
 
     def peg_count(self):
-        pegs = 0
-
-        for r in range(self.size):
-            for c in range(self.size):
-                if self.board[r, c] == Spot.PEG:
-                    pegs += 1
-
-        return pegs
+        return self.analysis().peg_count
 
     def free_count(self):
         free = 0
@@ -107,8 +145,7 @@ class Board:
         """
         :returns: a list of lists of tuples of tuples of possible moves from source > destination
         """
-        for free_position in self._free_positions():
-            yield from [(jump, free_position) for jump in self._possible_jumps_into_empty(free_position)]
+        yield from self.analysis().moves
 
     def make_move(self, source, destination):
         """
@@ -135,34 +172,10 @@ class Board:
         :param direction: The direction that you'd like to look in
         :return: The adjusted index of (r, c) after moving in a certain direction
         """
-        r, c = start_position
-
-        r -= direction.count('n')
-        r += direction.count('s')
-        c += direction.count('e')
-        c -= direction.count('w')
-
-        return r, c
-
-    def _possible_jumps_into_empty(self, empty_coord):
-        """
-        Given the coordinate of an empty space, will return the locations of all the pegs that could jump into that cell
-        :param empty_coord: the coordinate of the empty spot that you'd like to check from
-        """
-
-        for direction in self.directions:
-            if self.check_peg(empty_coord, direction) and self.check_peg(empty_coord, direction * 2):
-                yield self._adjusts_coords_to_direction(empty_coord, direction * 2)
-
-    def _free_positions(self):
-        """
-        Looks through the matrix and returns a list of empty spaces.
-        :returns a list of (r, c) coordinates where blank spots can be found on the board.
-        """
-        for r in range(self.size):
-            for c in range(self.size):
-                if self.board[r, c] == Spot.FREE:
-                    yield (r, c)
+        offset = _OFFSETS.get(direction)
+        if offset is None:
+            offset = _OFFSETS[direction] = Geometry._delta(direction)
+        return start_position[0] + offset[0], start_position[1] + offset[1]
 
     def _get_spot(self, start_position, direction):
         """
@@ -202,10 +215,13 @@ class Board:
 
 def main():
     board = Board.board_from_file(sys.argv[1])
+    hint_engine = hints.HintEngine(board)
 
     # Game loop
     while not board.is_goal():
         moves = [move for move in board.get_possible_moves()]
+        solutions, move_solutions = hint_engine.hints(board)
+        move_solutions = dict(move_solutions)
 
         print('\n{}'.format(board))
 
@@ -214,9 +230,10 @@ def main():
             print('You lost! Sorry')
             return 0
 
+        print('This board: {}'.format(_hint(solutions)))
         for move_num, move in enumerate(moves):
             source, destination = move
-            print('{}:\t{} --> {}'.format(move_num, source, destination))
+            print('{}:\t{} --> {}\t{}'.format(move_num, source, destination, _hint(move_solutions.get(move))))
 
         # Get input from the user as to which move to take next
         user_input = None
@@ -230,10 +247,20 @@ def main():
                 break
 
         board = board.make_move(*moves[user_input])
+        # Start counting from the new board before the loop even asks for its hints
+        hint_engine.focus(board)
 
     print('\nCongratulations! You won!')
     print(board)
 
 
+def _hint(solutions):
+    if solutions is None:
+        return 'still thinking...'
+    if solutions == 0:
+        return 'dead end'
+    return '{} solution{}'.format(solutions, '' if solutions == 1 else 's')
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,141 @@
+import copy
+import os
+import resource
+import time
+
+from paths import Path
+
+# How often, in seconds, a budget aims to read the clock and the memory
+CHECK_SECONDS = 0.01
+
+
+class BudgetExceeded(Exception):
+    """
+    Raised from inside a search when its Budget runs out. The message says which limit was reached, and limit names
+    it: 'nodes', 'time' or 'memory'.
+    """
+
+    def __init__(self, message, limit=None):
+        super().__init__(message)
+        self.limit = limit
+
+
+def memory_used():
+    """
+    :return: the resident memory of this process in bytes
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # Without /proc fall back on the high-water mark, which ru_maxrss gives in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Budget:
+    """
+    Limits on how long a search may run: a wall-clock time, a number of nodes and a ceiling on the memory of the
+    process. A searcher calls charge() for every node it visits, and charge() raises BudgetExceeded once any limit is
+    reached. The node count is checked exactly; the clock and the memory are read about every CHECK_SECONDS, going by
+the rate nodes have been charged at so far, and at least every check_interval nodes.
+
+    A search that runs part of its work in other processes sets outside_memory to the bytes those processes use, so
+    that the memory ceiling covers them too.
+
+    Along the way the budget keeps the deepest path charged to it. Every jump removes one peg, so that path reaches the
+    board with the fewest pegs seen so far, which is the best partial result the search can give when it is stopped.
+    """
+
+    def __init__(self, seconds=None, nodes=None, megabytes=None, check_interval=1024):
+        """
+        :param seconds: wall-clock seconds the search may take, from start()
+        :param nodes: number of nodes the search may visit
+        :param megabytes: resident memory the process may grow to
+        """
+        self.seconds = seconds
+        self.nodes = nodes
+        self.megabytes = megabytes
+        self.check_interval = check_interval
+        self.outside_memory = 0
+        self.start()
+
+    def start(self):
+        """
+        Starts the clock and clears the node count and the best path.
+        """
+        self.deadline = time.time() + self.seconds if self.seconds is not None else None
+        self.spent = 0
+        self.best = Path()
+        self._restart_checks()
+
+    def charge(self, path=None, nodes=1):
+        """
+        Records nodes visited, and path if it is the deepest yet.
+
+        :raises BudgetExceeded: if any limit has been reached
+        """
+        self.spent += nodes
+        if path is not None and len(path) > len(self.best):
+            self.best = path
+        if self.spent >= self._next_check:
+            self.check()
+            # Space the next check so that it comes about CHECK_SECONDS from now at the rate since the last one
+            now = time.time()
+            rate = (self.spent - self._checked_spent) / max(now - self._checked_at, 1e-9)
+            self._interval = max(1, min(self.check_interval, int(rate * CHECK_SECONDS)))
+            self._checked_at, self._checked_spent = now, self.spent
+            self._next_check = self._checkpoint()
+
+    def check(self):
+        """
+        :raises BudgetExceeded: if any limit has been reached
+        """
+        if self.nodes is not None and self.spent >= self.nodes:
+            raise self.exceeded('nodes')
+        if self.deadline is not None and time.time() >= self.deadline:
+            raise self.exceeded('time')
+        if self.megabytes is not None and memory_used() + self.outside_memory >= self.megabytes * 1024 * 1024:
+            raise self.exceeded('memory')
+
+    def exceeded(self, limit):
+        """
+        :param limit: 'nodes', 'time' or 'memory'
+        :return: the BudgetExceeded for reaching that limit of this budget
+        """
+        message = {'nodes': 'node limit of {} reached'.format(self.nodes),
+                   'time': 'time limit of {} seconds reached'.format(self.seconds),
+                   'memory': 'memory limit of {} MB reached'.format(self.megabytes)}[limit]
+        return BudgetExceeded(message, limit)
+
+    def share(self, parts):
+        """
+        :return: a budget for one of parts processes searching side by side: the same deadline, and an even share of
+        the nodes left and of the memory ceiling, so that together they stay within this budget
+        """
+        budget = copy.copy(self)
+        if self.nodes is not None:
+            budget.nodes = max(1, (self.nodes - self.spent) // parts)
+        if self.megabytes is not None:
+            budget.megabytes = self.megabytes / parts
+        budget.spent = 0
+        budget.best = Path()
+        budget._restart_checks()
+        return budget
+
+    def partial(self):
+        """
+        :return: the moves of the deepest path charged so far
+        """
+        return self.best.moves()
+
+    def _restart_checks(self):
+        # Until there is a rate to go by, checks start one node apart
+        self._interval = 1
+        self._checked_at, self._checked_spent = time.time(), self.spent
+        self._next_check = self._checkpoint()
+
+    def _checkpoint(self):
+        checkpoint = self.spent + self._interval
+        if self.nodes is not None:
+            checkpoint = min(checkpoint, self.nodes)
+        return checkpoint
@@ -0,0 +1,168 @@
+import lzma
+
+from geometry import Geometry
+
+MAGIC = b'PEGSOL01'
+
+
+class SolutionCounter:
+    """
+    Counts the solutions of a board without walking them one by one.
+
+    The number of solutions from a board is the sum over its legal jumps of the number from each child, and is the
+    same for every board in a symmetry class, so it is worked out once per canonical board and memoised. Alongside it
+    the counter keeps the mask of cells the last peg can finish on, held in the canonical board's frame and mapped
+    back through the inverse symmetry wherever it is used.
+
+    Enumeration walks the actual solutions, but only ever steps onto boards with a non-zero count, so it never explores
+    a dead end and its cost grows with the number of solutions rather than the size of the tree.
+    """
+
+    def __init__(self, start, pruner=None, budget=None):
+        """
+        :param budget: a Budget to charge every board counted or stepped onto to. Counting works on canonical boards
+        rather than along paths, so a counter stopped by its budget has no partial path to offer
+        """
+        self.start = start
+        self.geometry = start.geometry
+        self.pruner = pruner
+        self.budget = budget
+        self.memo = {}
+        self.nodes_visited = 0
+        self.space = 0
+
+    def count(self, pegs=None):
+        """
+        :param pegs: the board to count from, by default the start
+        :return: (solutions, finals): the number of distinct move sequences that leave one peg, and the bitmask of the
+        cells that last peg can end on
+        """
+        if pegs is None:
+            pegs = self.start.pegs
+        canonical, symmetry = self.geometry.canonical_symmetry(pegs)
+        solutions, finals = self._count(canonical)
+        self.space = len(self.memo)
+        return solutions, self.geometry.transform(finals, self.geometry.inverses[symmetry])
+
+    def solution(self, pegs=None):
+        """
+        :return: one solution as a list of (source, destination) moves, or None if there is none
+        """
+        return next(self.solutions(pegs), None)
+
+    def solutions(self, pegs=None):
+        """
+        Yields every solution as a list of (source, destination) moves.
+        """
+        jumps = self.geometry.jumps
+        for indices in self.solution_indices(pegs):
+            yield [jumps[index][0] for index in indices]
+
+    def solution_indices(self, pegs=None):
+        """
+        Yields every solution as a tuple of indices into the geometry's jump table.
+        """
+        if pegs is None:
+            pegs = self.start.pegs
+        if self.count(pegs)[0]:
+            yield from self._solutions(pegs, [])
+
+    def write(self, file_name, pegs=None):
+        """
+        Streams every solution to an xz compressed file: a header line describing the board, then each solution as a
+        fixed number of jump indices of one byte each (two if the board has more than 256 jumps).
+
+        :return: the number of solutions written
+        """
+        if pegs is None:
+            pegs = self.start.pegs
+        geometry = self.geometry
+        width = 1 if len(geometry.jumps) <= 256 else 2
+        header = '{} {:x} {} {:x} {}\n'.format(geometry.size, geometry.cells, ','.join(geometry.directions), pegs, width)
+
+        written = 0
+        with lzma.open(file_name, 'wb') as solution_file:
+            solution_file.write(MAGIC + header.encode('ascii'))
+            for indices in self.solution_indices(pegs):
+                solution_file.write(b''.join(index.to_bytes(width, 'little') for index in indices))
+                written += 1
+        return written
+
+    def _count(self, canonical):
+        """
+        :return: (solutions, finals) for a canonical board, with finals in the canonical board's own frame
+        """
+        result = self.memo.get(canonical)
+        if result is not None:
+            return result
+
+        self.nodes_visited += 1
+        if self.budget is not None:
+            self.budget.charge()
+        geometry = self.geometry
+        if not canonical & (canonical - 1):
+            result = (1, canonical) if canonical else (0, 0)
+        else:
+            solutions = finals = 0
+            for index in geometry.legal_jumps(canonical):
+                child = canonical ^ geometry.jumps[index][1]
+                if self.pruner is not None:
+                    self.pruner.checked += 1
+                    if not self.pruner.viable(child):
+                        self.pruner.pruned += 1
+                        # Memoised so that a lookup of the child, such as a hint for the move, finds its count
+                        self.memo.setdefault(geometry.canonical(child), (0, 0))
+                        continue
+                child_canonical, symmetry = geometry.canonical_symmetry(child)
+                child_solutions, child_finals = self._count(child_canonical)
+                if child_solutions:
+                    solutions += child_solutions
+                    finals |= geometry.transform(child_finals, geometry.inverses[symmetry])
+            result = (solutions, finals)
+
+        self.memo[canonical] = result
+        return result
+
+    def _solutions(self, pegs, path):
+        if self.budget is not None:
+            self.budget.charge()
+        if not pegs & (pegs - 1):
+            yield tuple(path)
+            return
+
+        geometry = self.geometry
+        for index in geometry.legal_jumps(pegs):
+            child = pegs ^ geometry.jumps[index][1]
+            if self._count(geometry.canonical(child))[0]:
+                path.append(index)
+                yield from self._solutions(child, path)
+                path.pop()
+
+
+def read_solutions(file_name):
+    """
+    Reads a file written by SolutionCounter.write.
+
+    :return: (geometry, start pegs, a generator of solutions as lists of (source, destination) moves)
+    """
+    solution_file = lzma.open(file_name, 'rb')
+    if solution_file.read(len(MAGIC)) != MAGIC:
+        solution_file.close()
+        raise ValueError('{} is not a solutions file'.format(file_name))
+    size, cells, directions, pegs, width = solution_file.readline().decode('ascii').split()
+    geometry = Geometry.get(int(size), int(cells, 16), directions.split(','))
+    pegs, width = int(pegs, 16), int(width)
+    record = width * (bin(pegs).count('1') - 1)
+
+    def solutions():
+        with solution_file:
+            if not record:
+                yield []
+                return
+            while True:
+                data = solution_file.read(record)
+                if len(data) < record:
+                    return
+                yield [geometry.jumps[int.from_bytes(data[i:i + width], 'little')][0] for i in range(0, record, width)]
+
+    return geometry, pegs, solutions()
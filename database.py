@@ -0,0 +1,168 @@
+import fcntl
+import os
+import time
+
+from lazy import lazy_import
+
+np = lazy_import('numpy')
+
+UNKNOWN, SOLVABLE, DEAD = range(3)
+
+MAGIC = b'PEGDB002'
+HEADER_BYTES = 64
+BUCKET_SLOTS = 8
+# Fields of one record, made into a numpy dtype only when a database is opened
+RECORD_FIELDS = [('key', '<u8'), ('stamp', '<u4'), ('status', 'u1'), ('pad', 'u1'), ('move', '<u2')]
+
+
+class PositionDatabase:
+    """
+    Solved and unsolvable positions kept on disk between runs, in a memory-mapped hash table with one file per board
+    geometry.
+
+    Positions are keyed by canonical bitmask, so one record covers every symmetric equivalent. A solvable record stores
+    the jump to make from the canonical board, which is mapped back onto the orientation of whatever board is being
+    looked up. Each key hashes to a bucket of BUCKET_SLOTS slots, by the high bits of a multiplicative hash over a
+    power of two number of buckets; when a bucket is full the least recently used record
+    is evicted (the one with fewer pegs, and so cheaper to prove again, on a tie). The file never grows past the size
+    it was created with.
+
+    Several processes can share one file: writers take an exclusive lock on it, and readers check the key again after
+    reading a record so a concurrent overwrite reads as a miss.
+    """
+
+    def __init__(self, directory, geometry, size_mb=64):
+        """
+        :param directory: where database files are kept
+        :param size_mb: the most a newly created file takes, rounded down to a power of two number of buckets; an
+        existing file keeps its own size
+        :raises ValueError: if the board has more than 64 cells, since keys are stored as uint64
+        """
+        geometry._check_fits_uint64()
+        self.geometry = geometry
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, '{}-{:x}-{}.db'.format(
+            geometry.size, geometry.cells, '-'.join(geometry.directions)))
+
+        record = np.dtype(RECORD_FIELDS)
+        buckets = max(1, int(size_mb * 1024 * 1024) // record.itemsize // BUCKET_SLOTS)
+        slots = (1 << buckets.bit_length() - 1) * BUCKET_SLOTS
+        self._file = open(self.path, 'a+b')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            self._file.seek(0)
+            header = self._file.read(HEADER_BYTES)
+            if header[:len(MAGIC)] == MAGIC:
+                slots = int(np.frombuffer(header, dtype='<u8', count=1, offset=len(MAGIC))[0])
+            else:
+                self._file.truncate(0)
+                self._file.write(MAGIC + np.uint64(slots).tobytes() + bytes(HEADER_BYTES - len(MAGIC) - 8))
+                self._file.truncate(HEADER_BYTES + slots * record.itemsize)
+                self._file.flush()
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+
+        self.slots = slots
+        self.bucket_bits = (slots // BUCKET_SLOTS).bit_length() - 1
+        self.records = np.memmap(self.path, dtype=record, mode='r+', offset=HEADER_BYTES, shape=(slots,))
+        self.lookups = 0
+        self.solvable_hits = 0
+        self.dead_hits = 0
+        self.writes = 0
+
+    def lookup(self, board):
+        """
+        :return: (status, moves), where moves is a stored line of play from board to a goal when status is SOLVABLE
+        """
+        self.lookups += 1
+        geometry = self.geometry
+        pegs = board.pegs
+        moves = []
+        while pegs & (pegs - 1):
+            canonical, symmetry = geometry.canonical_symmetry(pegs)
+            status, move = self._get(canonical)
+            if status == DEAD and not moves:
+                self.dead_hits += 1
+                return DEAD, None
+            if status != SOLVABLE:
+                return UNKNOWN, None
+
+            # Find the jump on this board that lands on the stored canonical child
+            target = canonical ^ geometry.jumps[move][1]
+            for index in geometry.legal_jumps(pegs):
+                if geometry.transform(pegs ^ geometry.jumps[index][1], symmetry) == target:
+                    break
+            else:
+                return UNKNOWN, None
+            moves.append(geometry.jumps[index][0])
+            pegs ^= geometry.jumps[index][1]
+
+        self.solvable_hits += 1
+        return SOLVABLE, moves
+
+    def record_dead(self, board):
+        self._put(self.geometry.canonical(board.pegs), DEAD, 0)
+
+    def record_solution(self, start, path):
+        """
+        Records every position along a solution as solvable, along with the move the solution made from it.
+        """
+        geometry = self.geometry
+        pegs = start.pegs
+        for move in path:
+            mask = geometry.jumps[geometry.jump_index[move]][1]
+            canonical, symmetry = geometry.canonical_symmetry(pegs)
+            child = geometry.transform(pegs ^ mask, symmetry)
+            for index in geometry.legal_jumps(canonical):
+                if canonical ^ geometry.jumps[index][1] == child:
+                    self._put(canonical, SOLVABLE, index)
+                    break
+            pegs ^= mask
+
+    def close(self):
+        self.records.flush()
+        self._file.close()
+
+    def _bucket(self, key):
+        # The high bits of the product depend on every bit of the key; the low bits only on the key's low bits
+        start = (((key * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> (64 - self.bucket_bits)) * BUCKET_SLOTS
+        return start, start + BUCKET_SLOTS
+
+    def _get(self, key):
+        start, end = self._bucket(key)
+        keys = self.records['key'][start:end]
+        for slot in np.flatnonzero(keys == np.uint64(key)):
+            record = self.records[start + slot]
+            status, move = int(record['status']), int(record['move'])
+            if int(self.records['key'][start + slot]) == key:
+                self.records['stamp'][start + slot] = int(time.time())
+                return status, move
+        return UNKNOWN, 0
+
+    def _put(self, key, status, move):
+        start, end = self._bucket(key)
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            bucket = self.records[start:end]
+            matches = np.flatnonzero(bucket['key'] == np.uint64(key))
+            empty = np.flatnonzero(bucket['key'] == 0)
+            if matches.size:
+                slot = matches[0]
+            elif empty.size:
+                slot = empty[0]
+            else:
+                slot = min(range(BUCKET_SLOTS),
+                           key=lambda i: (int(bucket['stamp'][i]), bin(int(bucket['key'][i])).count('1')))
+
+            # The key goes in last so that a reader never matches a half written record
+            self.records['key'][start + slot] = 0
+            self.records['status'][start + slot] = status
+            self.records['move'][start + slot] = move
+            self.records['stamp'][start + slot] = int(time.time())
+            self.records['key'][start + slot] = key
+            self.writes += 1
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def __len__(self):
+        return int(np.count_nonzero(self.records['key']))
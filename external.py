@@ -0,0 +1,394 @@
+import heapq
+import os
+import shutil
+import tempfile
+import weakref
+from collections import deque
+
+from bitboard import BitBoard
+from lazy import lazy_import
+from paths import Path
+
+np = lazy_import('numpy')
+
+# Rough in-memory cost of one entry, used to turn a memory budget in bytes into an entry count
+VISITED_ENTRY_BYTES = 100
+FRONTIER_ENTRY_BYTES = 400
+
+
+class SpillDirectory:
+    """
+    A directory of numbered binary files that is removed when the owning search is garbage collected.
+    """
+
+    def __init__(self, directory=None):
+        self.path = tempfile.mkdtemp(prefix='peg-spill-', dir=directory)
+        self.files = 0
+        self._cleanup = weakref.finalize(self, shutil.rmtree, self.path, True)
+
+    def write(self, array):
+        """
+        Writes an array to a new file and returns it memory-mapped read only.
+        """
+        file_name = self.save(array)
+        return np.memmap(file_name, dtype=array.dtype, mode='r', shape=array.shape)
+
+    def save(self, array):
+        """
+        Writes an array to a new file without keeping the file open.
+
+        :return: the file's name, for load
+        """
+        file_name = self.new_file()
+        array.tofile(file_name)
+        return file_name
+
+    def new_file(self):
+        file_name = os.path.join(self.path, '{}.bin'.format(self.files))
+        self.files += 1
+        return file_name
+
+    @staticmethod
+    def load(file_name, dtype, start=0, count=-1):
+        """
+        :return: count records (or all the rest) of a saved array from index start, the file only open while reading
+        """
+        with open(file_name, 'rb') as f:
+            f.seek(start * dtype.itemsize)
+            return np.fromfile(f, dtype=dtype, count=count)
+
+    def allocate(self, dtype, length):
+        file_name = self.new_file()
+        return np.memmap(file_name, dtype=dtype, mode='w+', shape=(length,))
+
+    @staticmethod
+    def remove(array):
+        file_name = array.filename
+        del array
+        os.remove(file_name)
+
+
+class SortedRuns:
+    """
+    A set of uint64 keys kept on disk as sorted, memory-mapped runs.
+
+    Membership is a binary search in every run. Once there are more than max_runs runs they are merged into one, so a
+    lookup never touches more than max_runs files.
+    """
+
+    def __init__(self, directory, max_runs=8):
+        self.directory = directory
+        self.max_runs = max_runs
+        self.runs = []
+
+    def add(self, keys):
+        """
+        :param keys: a sorted array of unique keys, none of which are already stored
+        """
+        if keys.size == 0:
+            return
+        self.runs.append(self.directory.write(keys))
+        if len(self.runs) > self.max_runs:
+            while len(self.runs) > 1:
+                self.runs.append(self._merge(self.runs.pop(0), self.runs.pop(0)))
+
+    def contains(self, key):
+        key = np.uint64(key)
+        for run in self.runs:
+            position = np.searchsorted(run, key)
+            if position < run.size and run[position] == key:
+                return True
+        return False
+
+    def _merge(self, first, second, chunk=1 << 20):
+        """
+        Merges two sorted runs into a new run without loading either of them fully. Every key's place in the output is
+        its index in its own run plus the number of smaller keys in the other run.
+        """
+        merged = self.directory.allocate(np.uint64, first.size + second.size)
+        for run, other, side in ((first, second, 'left'), (second, first, 'right')):
+            for start in range(0, run.size, chunk):
+                keys = np.asarray(run[start:start + chunk])
+                positions = np.arange(start, start + keys.size) + np.searchsorted(other, keys, side=side)
+                merged[positions] = keys
+        merged.flush()
+        SpillDirectory.remove(first)
+        SpillDirectory.remove(second)
+        return merged
+
+    def __len__(self):
+        return sum(run.size for run in self.runs)
+
+
+class ExternalVisitedSet:
+    """
+    Visited set that keeps recent keys in memory and spills them to SortedRuns once its memory budget is used up.
+    It has the same interface as VisitedSet.
+    """
+
+    def __init__(self, memory_budget, check_symmetrical=False, directory=None):
+        """
+        :param memory_budget: bytes of memory to use before spilling to disk
+        """
+        self.check_symmetrical = check_symmetrical
+        self.capacity = max(1, memory_budget // VISITED_ENTRY_BYTES)
+        self.directory = SpillDirectory(directory)
+        self.runs = SortedRuns(self.directory)
+        self.keys = set()
+        self.spilled = 0
+
+    def key(self, board):
+        return board.canonical_key() if self.check_symmetrical else board.key()
+
+    def visit(self, board):
+        key = self.key(board)
+        if key in self.keys or self.runs.contains(key):
+            return False
+
+        self.keys.add(key)
+        if len(self.keys) >= self.capacity:
+            self.spilled += len(self.keys)
+            self.runs.add(np.array(sorted(self.keys), dtype=np.uint64))
+            self.keys = set()
+        return True
+
+    def __contains__(self, board):
+        key = self.key(board)
+        return key in self.keys or self.runs.contains(key)
+
+    def __len__(self):
+        return len(self.keys) + len(self.runs)
+
+
+class _FrontierRecords:
+    """
+    Packs (board, path) frontier entries into fixed width numpy records: the peg bitmask plus the path as indices into
+    the geometry's jump table.
+    """
+
+    def __init__(self, geometry, max_depth, extra_fields=()):
+        self.geometry = geometry
+        self.dtype = np.dtype(list(extra_fields) + [('pegs', np.uint64), ('length', np.uint16),
+                                                    ('path', np.uint16, (max(1, max_depth),))])
+
+    def pack(self, entries):
+        """
+        :param entries: tuples of (*extra_fields, pegs, path as jump indices)
+        """
+        records = np.zeros(len(entries), dtype=self.dtype)
+        extras = len(self.dtype.names) - 3
+        for field in range(extras):
+            records[self.dtype.names[field]] = [entry[field] for entry in entries]
+        records['pegs'] = [entry[extras] for entry in entries]
+        for i, entry in enumerate(entries):
+            path = entry[extras + 1]
+            records['length'][i] = len(path)
+            records['path'][i, :len(path)] = path
+        return records
+
+    def unpack(self, records):
+        extras = len(self.dtype.names) - 3
+        return [tuple(record[field].item() for field in range(extras)) +
+                (int(record['pegs']), tuple(int(i) for i in record['path'][:record['length']]))
+                for record in records]
+
+    def encode(self, board, path):
+        return board.pegs, tuple(self.geometry.jump_index[move] for move in path.moves())
+
+    def decode(self, pegs, path):
+        return BitBoard(self.geometry, pegs), Path.from_moves(self.geometry.jumps[index][0] for index in path)
+
+
+class ExternalQueue:
+    """
+    FIFO frontier for breadth first search that writes its middle section to disk once it outgrows its memory budget.
+
+    New entries collect in an in-memory tail and entries are taken from an in-memory head; whenever the tail fills up it
+    is written out as a segment file, and segments are read back in order once the head runs dry.
+    """
+
+    def __init__(self, start, memory_budget, directory=None):
+        self.records = _FrontierRecords(start.geometry, start.peg_count())
+        self.capacity = max(1, memory_budget // (2 * FRONTIER_ENTRY_BYTES))
+        self.directory = SpillDirectory(directory)
+        self.head = deque()
+        self.tail = []
+        self.segments = deque()
+        self.on_disk = 0
+        self.spilled = 0
+
+    def append(self, entry):
+        self.tail.append(self.records.encode(*entry))
+        if len(self.tail) >= self.capacity:
+            # Only the segment's name is kept, so the number of segments is not limited by open file descriptors
+            self.segments.append(self.directory.save(self.records.pack(self.tail)))
+            self.on_disk += len(self.tail)
+            self.spilled += len(self.tail)
+            self.tail = []
+
+    def popleft(self):
+        if not self.head:
+            if self.segments:
+                file_name = self.segments.popleft()
+                segment = SpillDirectory.load(file_name, self.records.dtype)
+                self.head.extend(self.records.unpack(segment))
+                self.on_disk -= segment.size
+                os.remove(file_name)
+            else:
+                self.head.extend(self.tail)
+                self.tail = []
+        return self.records.decode(*self.head.popleft())
+
+    def __len__(self):
+        return len(self.head) + self.on_disk + len(self.tail)
+
+
+class _Run:
+    """
+    A run of frontier records sorted by priority in a spill file, read a chunk at a time with the file only open while
+    reading. head is the (value, order) of the next record, or None once the run is used up.
+    """
+
+    def __init__(self, file_name, dtype, size):
+        self.file_name = file_name
+        self.dtype = dtype
+        self.size = size
+        self.position = 0
+        self.head = None
+        self._peek()
+
+    def read(self, count):
+        records = SpillDirectory.load(self.file_name, self.dtype, self.position, count)
+        self.position += records.size
+        self._peek()
+        return records
+
+    def remove(self):
+        os.remove(self.file_name)
+
+    def _peek(self):
+        if self.position < self.size:
+            record = SpillDirectory.load(self.file_name, self.dtype, self.position, 1)[0]
+            self.head = (record['value'].item(), record['order'].item())
+        else:
+            self.head = None
+
+    def __len__(self):
+        return self.size - self.position
+
+
+class ExternalPriorityQueue:
+    """
+    Priority queue for A* that keeps a bounded heap in memory.
+
+    When the heap outgrows its budget the worse half is written to disk as a run sorted by priority. Before every pop
+    the queue pulls a chunk from the run with the best next entry, found through a heap of the runs' next entries,
+    whenever that entry beats the best entry in memory, so entries still come out in priority order. Ties are broken by
+    insertion order. Once there are more than max_runs runs the smaller half of them are merged into one, much as
+    SortedRuns does.
+    """
+
+    def __init__(self, heuristic, start, memory_budget, directory=None, max_runs=8):
+        self.heuristic = heuristic
+        self.records = _FrontierRecords(start.geometry, start.peg_count(), [('value', np.float64), ('order', np.int64)])
+        self.capacity = max(2, memory_budget // FRONTIER_ENTRY_BYTES)
+        self.directory = SpillDirectory(directory)
+        self.max_runs = max_runs
+        self.heap = []
+        # (value, order, run id) of the next entry of every run, and the runs by id
+        self.heads = []
+        self.runs = {}
+        self.run_ids = 0
+        self.order = 0
+        self.spilled = 0
+        # The f-value of the entry most recently taken out
+        self.bound = None
+
+    def put(self, board_path_tup, h=None):
+        board, path = board_path_tup
+        if h is None:
+            h = self.heuristic(board)
+        heapq.heappush(self.heap, (h + len(path), self.order) + self.records.encode(board, path))
+        self.order += 1
+
+        if len(self.heap) > self.capacity:
+            self.heap.sort()
+            keep = len(self.heap) // 2
+            worse = self.heap[keep:]
+            del self.heap[keep:]
+            self._add_run(self.directory.save(self.records.pack(worse)), len(worse))
+            self.spilled += len(worse)
+            if len(self.runs) > self.max_runs:
+                self._merge_runs()
+
+    def get(self):
+        self._refill()
+        entry = heapq.heappop(self.heap)
+        self.bound = entry[0]
+        return self.records.decode(*entry[2:])
+
+    def _refill(self):
+        chunk = max(1, self.capacity // 4)
+        while self.heads:
+            value, order, run_id = self.heads[0]
+            if self.heap and self.heap[0][:2] <= (value, order):
+                return
+
+            run = self.runs[run_id]
+            for entry in self.records.unpack(run.read(chunk)):
+                heapq.heappush(self.heap, entry)
+            if run.head is None:
+                heapq.heappop(self.heads)
+                del self.runs[run_id]
+                run.remove()
+            else:
+                heapq.heapreplace(self.heads, run.head + (run_id,))
+
+    def _add_run(self, file_name, size):
+        run = _Run(file_name, self.records.dtype, size)
+        self.runs[self.run_ids] = run
+        heapq.heappush(self.heads, run.head + (self.run_ids,))
+        self.run_ids += 1
+
+    def _merge_runs(self, chunk=4096):
+        """
+        Merges the smaller half of the runs into one, so the big runs are not copied again every time, holding at most
+        chunk records of each in memory. Each round takes from every run's buffer the records up to the smallest of
+        the buffers' last records, which empties at least one buffer, and appends them to the merged file in order.
+        """
+        by_size = sorted(self.runs, key=lambda run_id: len(self.runs[run_id]))
+        merging = by_size[:len(by_size) // 2 + 1]
+        runs = [self.runs.pop(run_id) for run_id in merging]
+        buffers = [run.read(chunk) for run in runs]
+        file_name = self.directory.new_file()
+        size = 0
+        with open(file_name, 'wb') as merged:
+            while runs:
+                bound = min((records['value'][-1], records['order'][-1]) for records in buffers)
+                taken = []
+                for i, records in enumerate(buffers):
+                    values, orders = records['value'], records['order']
+                    upto = (values < bound[0]) | ((values == bound[0]) & (orders <= bound[1]))
+                    taken.append(records[upto])
+                    buffers[i] = records[~upto]
+                taken = np.concatenate(taken)
+                taken[np.lexsort((taken['order'], taken['value']))].tofile(merged)
+                size += taken.size
+
+                for i in reversed(range(len(runs))):
+                    if not buffers[i].size:
+                        if runs[i].head is None:
+                            runs[i].remove()
+                            del runs[i], buffers[i]
+                        else:
+                            buffers[i] = runs[i].read(chunk)
+
+        self.heads = [head for head in self.heads if head[2] in self.runs]
+        heapq.heapify(self.heads)
+        self._add_run(file_name, size)
+
+    def empty(self):
+        return not self.heap and not self.heads
+
+    def __len__(self):
+        return len(self.heap) + sum(len(run) for run in self.runs.values())
@@ -0,0 +1,447 @@
+import marshal
+import os
+from itertools import product
+
+from lazy import lazy_import
+
+np = lazy_import('numpy')
+
+# The direction sets a board file can name on its first line
+DIRECTION_SETS = {
+    'all': ('n', 'ne', 'e', 'se', 's', 'sw', 'w', 'nw'),
+    'ortho': ('n', 'e', 's', 'w'),
+    'swne': ('n', 'ne', 'e', 's', 'sw', 'w'),
+}
+
+COMPILED_MAGIC = b'PEGGEO01'
+COMPILED_SUFFIX = '.compiled'
+
+
+class Geometry:
+    """
+    Precomputed jump tables for one board shape and direction set.
+
+    Cells are numbered row-major over the full size x size grid, so the cell at (r, c) is bit r * size + c of a
+    board bitmask. Every jump is described by three single-bit masks (source, hop, destination) so a board held as
+    an integer can be tested and updated with a handful of bit operations.
+    """
+    _cache = {}
+
+    def __init__(self, size, cells, directions):
+        """
+        :param size: the length or width of the (square) board
+        :param cells: bitmask of every playable (not out of bounds) cell
+        :param directions: the list of directions travel is allowed in, eg ['n', 'e', 's', 'w']
+        """
+        self.size = size
+        self.cells = cells
+        self.directions = tuple(directions)
+        self.coords = [(r, c) for r in range(size) for c in range(size)]
+        self.deltas = [self._delta(direction) for direction in self.directions]
+
+        # Every legal jump as (move, mask, needed, destination), where mask flips all three cells and needed holds
+        # the source and hop bits that must both be pegs. They are ordered by destination cell and then by direction,
+        # matching the order Board.get_possible_moves produces them in.
+        self.jumps = []
+        self.jump_index = {}
+        self.into = [[] for _ in range(size * size)]
+        self._probes = []
+
+        for dr, dc in self.deltas:
+            valid = 0
+            for r, c in self.coords:
+                if self._jump_cells(r, c, dr, dc) is not None:
+                    valid |= self._bit(r, c)
+            hop_shift = dr * size + dc
+            self._probes.append((hop_shift, 2 * hop_shift, valid))
+
+        for r, c in self.coords:
+            for dr, dc in self.deltas:
+                jump = self._jump_cells(r, c, dr, dc)
+                if jump is None:
+                    continue
+                source, hop, destination = jump
+                needed = self._bit(*source) | self._bit(*hop)
+                dest_bit = self._bit(*destination)
+                move = (source, destination)
+
+                self.jump_index[move] = len(self.jumps)
+                self.into[r * size + c].append((needed, len(self.jumps)))
+                self.jumps.append((move, needed | dest_bit, needed, dest_bit))
+
+        self.symmetries = self._symmetries()
+        self.inverses = self._inverses()
+        self._symmetry_tables = [self._byte_tables(permutation) for permutation in self.symmetries[1:]]
+        self._array_tables = None
+        self._neighbourhoods = None
+        self._jumps_from = None
+
+    @classmethod
+    def get(cls, size, cells, directions):
+        """
+        Returns the shared geometry for a board shape, building its tables the first time it is asked for.
+        """
+        key = (size, cells, tuple(directions))
+        geometry = cls._cache.get(key)
+        if geometry is None:
+            geometry = cls._cache[key] = cls(size, cells, directions)
+        return geometry
+
+    @classmethod
+    def _from_tables(cls, size, cells, directions, tables):
+        """
+        Returns the shared geometry for a board shape, taking its tables from a compiled board file instead of
+        building them.
+        """
+        key = (size, cells, tuple(directions))
+        geometry = cls._cache.get(key)
+        if geometry is None:
+            geometry = cls.__new__(cls)
+            geometry.size = size
+            geometry.cells = cells
+            geometry.directions = tuple(directions)
+            geometry.coords = [(r, c) for r in range(size) for c in range(size)]
+            geometry.deltas = [cls._delta(direction) for direction in geometry.directions]
+            geometry._array_tables = None
+            for name, value in tables.items():
+                setattr(geometry, name, value)
+            geometry.jump_index = {jump[0]: index for index, jump in enumerate(geometry.jumps)}
+            cls._cache[key] = geometry
+        return geometry
+
+    def _tables(self):
+        """
+        :return: every table the constructor builds that takes real work, along with the lazily built neighbourhood
+        and jumps_from tables, as plain lists and tuples that marshal can store
+        """
+        if self.jumps:
+            self.neighbourhood(0)
+        self.jumps_from(0)
+        return {'jumps': self.jumps, 'into': self.into, '_probes': self._probes, 'symmetries': self.symmetries,
+                'inverses': self.inverses, '_symmetry_tables': self._symmetry_tables,
+                '_neighbourhoods': self._neighbourhoods, '_jumps_from': self._jumps_from}
+
+    def __reduce__(self):
+        # Geometries are shared per shape, so unpickling goes back through the cache instead of copying the tables
+        return Geometry.get, (self.size, self.cells, self.directions)
+
+    def legal_jumps(self, pegs):
+        """
+        :param pegs: bitmask of the cells holding a peg
+        :return: the indices into self.jumps of every jump that can be made on this board
+        """
+        free = self.cells & ~pegs
+        targets = 0
+        for hop_shift, source_shift, valid in self._probes:
+            targets |= free & valid & _shift(pegs, hop_shift) & _shift(pegs, source_shift)
+
+        jumps = []
+        while targets:
+            low = targets & -targets
+            for needed, index in self.into[low.bit_length() - 1]:
+                if pegs & needed == needed:
+                    jumps.append(index)
+            targets ^= low
+        return jumps
+
+    def is_legal(self, pegs, index):
+        _, _, needed, dest_bit = self.jumps[index]
+        return pegs & needed == needed and not pegs & dest_bit
+
+    def neighbourhood(self, index):
+        """
+        :return: (jumps, sources) where jumps are the indices of every jump sharing a cell with jump index, and sources
+        are the cells those jumps start from. These are the only jumps whose legality can change when it is made.
+        """
+        if self._neighbourhoods is None:
+            by_cell = [[] for _ in range(self.size * self.size)]
+            for i, (_, mask, _, _) in enumerate(self.jumps):
+                for cell in cells_of(mask):
+                    by_cell[cell].append(i)
+
+            self._neighbourhoods = []
+            for _, mask, _, _ in self.jumps:
+                jumps = sorted({i for cell in cells_of(mask) for i in by_cell[cell]})
+                sources = sorted({self._cell(*self.jumps[i][0][0]) for i in jumps})
+                self._neighbourhoods.append((jumps, sources))
+        return self._neighbourhoods[index]
+
+    def jumps_from(self, cell):
+        """
+        :return: the indices of every jump whose source is the given cell index
+        """
+        if self._jumps_from is None:
+            self._jumps_from = [[] for _ in range(self.size * self.size)]
+            for i, ((source, _), _, _, _) in enumerate(self.jumps):
+                self._jumps_from[self._cell(*source)].append(i)
+        return self._jumps_from[cell]
+
+    def reverse_jumps(self, pegs):
+        """
+        :param pegs: bitmask of the cells holding a peg
+        :return: the indices into self.jumps of every jump that could have produced this board
+        """
+        return [index for index, (_, _, needed, dest_bit) in enumerate(self.jumps)
+                if pegs & dest_bit and not pegs & needed]
+
+    def jump_arrays(self):
+        """
+        :return: (needed, destination, mask) as uint64 arrays with one entry per jump, for testing and applying a jump
+        to a whole array of boards at once
+        """
+        self._check_fits_uint64()
+        needed = np.array([jump[2] for jump in self.jumps], dtype=np.uint64)
+        destination = np.array([jump[3] for jump in self.jumps], dtype=np.uint64)
+        mask = np.array([jump[1] for jump in self.jumps], dtype=np.uint64)
+        return needed, destination, mask
+
+    def canonical_array(self, keys):
+        """
+        Vectorised canonical: maps a uint64 array of board bitmasks to the smallest bitmask in each board's symmetry
+        class.
+        """
+        self._check_fits_uint64()
+        if self._array_tables is None:
+            self._array_tables = [[np.array(table, dtype=np.uint64) for table in tables]
+                                  for tables in self._symmetry_tables]
+
+        best = keys.copy()
+        for tables in self._array_tables:
+            image = np.zeros_like(keys)
+            for chunk, table in enumerate(tables):
+                image |= table[((keys >> np.uint64(8 * chunk)) & np.uint64(255)).astype(np.intp)]
+            np.minimum(best, image, out=best)
+        return best
+
+    def transform(self, pegs, symmetry):
+        """
+        :param pegs: bitmask of the cells holding a peg
+        :param symmetry: index into self.symmetries
+        :return: the bitmask of the board after applying that symmetry
+        """
+        if symmetry == 0:
+            return pegs
+        return _apply_tables(self._symmetry_tables[symmetry - 1], pegs)
+
+    def canonical(self, pegs):
+        """
+        Returns the smallest bitmask among all the boards symmetrically equivalent to this one, so that every member of
+        a symmetry class shares one key.
+        """
+        best = pegs
+        for tables in self._symmetry_tables:
+            image = _apply_tables(tables, pegs)
+            if image < best:
+                best = image
+        return best
+
+    def canonical_symmetry(self, pegs):
+        """
+        :return: (canonical, symmetry) where symmetry is an index into self.symmetries that maps this board onto its
+        canonical bitmask
+        """
+        best, best_symmetry = pegs, 0
+        for symmetry, tables in enumerate(self._symmetry_tables, 1):
+            image = _apply_tables(tables, pegs)
+            if image < best:
+                best, best_symmetry = image, symmetry
+        return best, best_symmetry
+
+    def _inverses(self):
+        """
+        :return: for every symmetry, the index of the symmetry that undoes it
+        """
+        cells = [i for i, (r, c) in enumerate(self.coords) if self._playable(r, c)]
+        return [next(j for j, inverse in enumerate(self.symmetries) if all(inverse[symmetry[i]] == i for i in cells))
+                for symmetry in self.symmetries]
+
+    def _symmetries(self):
+        """
+        Finds every reflection and rotation that maps the playable cells onto themselves and the direction set onto
+        itself. Each is returned as a list mapping cell index to cell index, with the identity first.
+
+        Candidates are the integer linear maps of the (r, c) lattice, so the triangular 'swne' boards pick up their
+        three-fold rotations as well as the square boards picking up their quarter turns.
+        """
+        cells = [(r, c) for r, c in self.coords if self._playable(r, c)]
+        cell_set = set(cells)
+        r_min = min(r for r, _ in cells)
+        c_min = min(c for _, c in cells)
+        deltas = set(self.deltas) | {(-dr, -dc) for dr, dc in self.deltas}
+
+        symmetries = [list(range(self.size * self.size))]
+        for a, b, c, d in product((-1, 0, 1), repeat=4):
+            if a * d - b * c not in (1, -1) or (a, b, c, d) == (1, 0, 0, 1):
+                continue
+            if {(a * dr + b * dc, c * dr + d * dc) for dr, dc in deltas} != deltas:
+                continue
+
+            image = [(a * r + b * cc, c * r + d * cc) for r, cc in cells]
+            r_shift = r_min - min(r for r, _ in image)
+            c_shift = c_min - min(cc for _, cc in image)
+            image = [(r + r_shift, cc + c_shift) for r, cc in image]
+            if set(image) != cell_set:
+                continue
+
+            permutation = list(range(self.size * self.size))
+            for (r, cc), (rr, ccc) in zip(cells, image):
+                permutation[r * self.size + cc] = rr * self.size + ccc
+            symmetries.append(permutation)
+        return symmetries
+
+    def _byte_tables(self, permutation):
+        """
+        Splits a cell permutation into lookup tables, one per byte of the bitmask, giving the permuted image of every
+        possible value of that byte.
+        """
+        tables = []
+        for offset in range(0, self.size * self.size, 8):
+            table = [0] * 256
+            for value in range(1, 256):
+                low = value & -value
+                bit = offset + low.bit_length() - 1
+                image = 1 << permutation[bit] if bit < len(permutation) else 0
+                table[value] = table[value ^ low] | image
+            tables.append(table)
+        return tables
+
+    def _check_fits_uint64(self):
+        if self.size * self.size > 64:
+            raise ValueError('A {0}x{0} board does not fit in a 64 bit key'.format(self.size))
+
+    def _cell(self, r, c):
+        return r * self.size + c
+
+    def _bit(self, r, c):
+        return 1 << (r * self.size + c)
+
+    def _playable(self, r, c):
+        return 0 <= r < self.size and 0 <= c < self.size and bool(self.cells & self._bit(r, c))
+
+    def _jump_cells(self, r, c, dr, dc):
+        """
+        Returns the (source, hop, destination) coordinates of the jump landing on (r, c) from direction (dr, dc), or
+        None if any of the three cells is off the board.
+        """
+        hop = (r + dr, c + dc)
+        source = (r + 2 * dr, c + 2 * dc)
+        if self._playable(r, c) and self._playable(*hop) and self._playable(*source):
+            return source, hop, (r, c)
+        return None
+
+    @staticmethod
+    def _delta(direction):
+        return direction.count('s') - direction.count('n'), direction.count('e') - direction.count('w')
+
+
+def parse_board(text):
+    """
+    :param text: the contents of a board file: a direction set name, a line of column numbers, then one line per row
+    of '*' (peg), 'o' (empty) or anything else (off the board), separated by spaces
+    :return: (size, cells, pegs, directions): cells and pegs as bitmasks
+    """
+    name, _, *rows = text.splitlines()
+    directions = DIRECTION_SETS.get(name.strip())
+    if directions is None:
+        raise ValueError('Unknown direction set {!r}'.format(name.strip()))
+
+    rows = [row.strip().split(' ') for row in rows if row.strip()]
+    size = len(rows)
+    cells = pegs = 0
+    for r, row in enumerate(rows):
+        for c, spot in enumerate(row):
+            if spot == '*':
+                pegs |= 1 << (r * size + c)
+            if spot in ('*', 'o'):
+                cells |= 1 << (r * size + c)
+    return size, cells, pegs, directions
+
+
+def load_board(file_name):
+    """
+    Reads a board file through its compiled form, a binary file next to it holding the geometry's tables and the
+    starting pegs. The compiled file is used when it was compiled from the board file as it is now (same modification
+    time and size), so loading needs no parsing and no table building; otherwise the board is parsed and compiled
+    again.
+
+    :return: (geometry, pegs)
+    """
+    source = os.stat(file_name)
+    compiled_name = file_name + COMPILED_SUFFIX
+    try:
+        with open(compiled_name, 'rb') as compiled_file:
+            data = compiled_file.read()
+        if data.startswith(COMPILED_MAGIC):
+            # Unmarshalled from one bytes object, since marshal.load reads a file object in many small pieces
+            stamp, size, cells, directions, pegs, tables = marshal.loads(data[len(COMPILED_MAGIC):])
+            if stamp == (source.st_mtime_ns, source.st_size):
+                return Geometry._from_tables(size, cells, directions, tables), pegs
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    return compile_board(file_name)
+
+
+def compile_board(file_name):
+    """
+    Parses a board file and writes its compiled form next to it (see load_board). A directory that cannot be written
+    to only means the next load parses the file again.
+
+    :return: (geometry, pegs)
+    """
+    with open(file_name) as board_file:
+        size, cells, pegs, directions = parse_board(board_file.read())
+    source = os.stat(file_name)
+    geometry = Geometry.get(size, cells, directions)
+    compiled_name = file_name + COMPILED_SUFFIX
+    # Written under a name of its own and moved into place, so a process loading it never sees half a file
+    temporary_name = '{}.{}'.format(compiled_name, os.getpid())
+    try:
+        with open(temporary_name, 'wb') as compiled_file:
+            compiled_file.write(COMPILED_MAGIC)
+            marshal.dump(((source.st_mtime_ns, source.st_size), size, cells, directions, pegs, geometry._tables()),
+                         compiled_file)
+        os.replace(temporary_name, compiled_name)
+    except OSError:
+        pass
+    return geometry, pegs
+
+
+def mask_of(indices):
+    """
+    :param indices: cell indices
+    :return: the bitmask with those cells set
+    """
+    mask = 0
+    for i in indices:
+        mask |= 1 << int(i)
+    return mask
+
+
+def cells_of(mask):
+    """
+    :param mask: a bitmask of cells
+    :return: the indices of the cells set in it, lowest first
+    """
+    cells = []
+    while mask:
+        low = mask & -mask
+        cells.append(low.bit_length() - 1)
+        mask ^= low
+    return cells
+
+
+def _apply_tables(tables, pegs):
+    image = 0
+    for table in tables:
+        if not pegs:
+            break
+        image |= table[pegs & 255]
+        pegs >>= 8
+    return image
+
+
+def _shift(bits, offset):
+    """
+    Moves the bit for cell i + offset down onto cell i.
+    """
+    return bits >> offset if offset >= 0 else bits << -offset
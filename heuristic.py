@@ -1,52 +1,189 @@
-from board import Spot
+from geometry import cells_of
 
 
 def max_moves(board):
-    pegs_on_board = board.peg_count()
-    moves = [move for move in board.get_possible_moves()]
+    analysis = board.analysis()
+    return _max_moves_score(analysis.peg_count, len(analysis.moves), analysis.movable_pegs)
 
-    if len(moves) == 0:
-        return float('inf')
 
-    moves, _ = zip(*moves)
-    pegs_with_move = len(list(set(moves)))
-    return pegs_on_board - 1 - (pegs_with_move / pegs_on_board)
+def min_moves(board):
+    analysis = board.analysis()
+    return _min_moves_score(analysis.peg_count, len(analysis.moves), analysis.movable_pegs)
 
 
-def min_moves(board):
-    pegs_on_board = board.peg_count()
-    moves = [move for move in board.get_possible_moves()]
+def max_movable_pegs(board):
+    analysis = board.analysis()
+    return _max_movable_pegs_score(analysis.peg_count, len(analysis.moves), analysis.movable_pegs)
 
-    if len(moves) == 0:
-        return float('inf')
 
-    moves, _ = zip(*moves)
-    moves = len(moves)
-    return pegs_on_board - 1 - (moves / (moves + 1))
+def manhattan_distance(board):
+    """
+    The sum of the Manhattan distances over every unordered pair of pegs, divided by the number of pegs: the original
+    all-pairs score, which counted each pair from both ends, over twice the number of pegs. It is worked out from the
+    peg bitmask through the number of pegs in each row and column, without reading the board's matrix.
+    """
+    rows, columns = _line_counts(board)
+    return IncrementalManhattanDistance._score(rows, columns)
 
 
-def max_movable_pegs(board):
-    pegs_on_board = board.peg_count()
-    moves = [move for move in board.get_possible_moves()]
+def _max_moves_score(pegs_on_board, moves, pegs_with_move):
+    if moves == 0:
+        return float('inf')
+    return pegs_on_board - 1 - (pegs_with_move / pegs_on_board)
+
 
-    if len(moves) == 0:
+def _min_moves_score(pegs_on_board, moves, pegs_with_move):
+    if moves == 0:
         return float('inf')
+    return pegs_on_board - 1 - (moves / (moves + 1))
+
 
-    moves, _ = zip(*moves)
-    moves = len(moves)
+def _max_movable_pegs_score(pegs_on_board, moves, pegs_with_move):
+    if moves == 0:
+        return float('inf')
     return pegs_on_board - 1 - (1 / (moves + 1))
 
 
-def manhattan_distance(board):
-    man = 0
-    number_of_pegs = 0
-
-    for r in range(board.size):
-        for c in range(board.size):
-            if board.board[r, c] == Spot.PEG:
-                number_of_pegs += 1
-                for rr in range(board.size):
-                    for cc in range(board.size):
-                        if board.board[rr, cc] == Spot.PEG:
-                            man += abs(r - rr) + abs(c - cc)
-    return man / (2 * number_of_pegs)
+class IncrementalMobility:
+    """
+    Incremental version of the heuristics scored from the number of legal moves and of pegs that can move.
+
+    evaluate(board) scores a board from scratch and also returns a state. update(state, move, child) scores a child
+    from its parent's state: only the jumps sharing a cell with the move can change, so only those are rechecked.
+    Calling the object with a board works like the plain heuristic function.
+    """
+
+    def __init__(self, score):
+        self.score = score
+
+    def evaluate(self, board):
+        analysis = board.analysis()
+        state = (board.geometry, board.pegs, analysis.peg_count, len(analysis.moves), analysis.movable_pegs)
+        return self.score(*state[2:]), state
+
+    def update(self, state, move, child):
+        geometry, pegs, peg_count, moves, movable = state
+        index = geometry.jump_index[move]
+        child_pegs = pegs ^ geometry.jumps[index][1]
+        jumps, sources = geometry.neighbourhood(index)
+
+        for i in jumps:
+            moves += geometry.is_legal(child_pegs, i) - geometry.is_legal(pegs, i)
+        for source in sources:
+            was_movable = any(geometry.is_legal(pegs, i) for i in geometry.jumps_from(source))
+            is_movable = any(geometry.is_legal(child_pegs, i) for i in geometry.jumps_from(source))
+            movable += is_movable - was_movable
+
+        state = (geometry, child_pegs, peg_count - 1, moves, movable)
+        return self.score(peg_count - 1, moves, movable), state
+
+    def __call__(self, board):
+        return self.evaluate(board)[0]
+
+
+class IncrementalManhattanDistance:
+    """
+    Incremental version of manhattan_distance.
+
+    The sum of pairwise distances separates into rows and columns, so it can be worked out in O(N) from the number of
+    pegs in each row and column. A move only changes three of those counts.
+    """
+
+    def evaluate(self, board):
+        rows, columns = _line_counts(board)
+        return self._score(rows, columns), (rows, columns)
+
+    def update(self, state, move, child):
+        rows, columns = list(state[0]), list(state[1])
+        (r, c), (rr, cc) = move
+        rows[r] -= 1
+        columns[c] -= 1
+        rows[(r + rr) // 2] -= 1
+        columns[(c + cc) // 2] -= 1
+        rows[rr] += 1
+        columns[cc] += 1
+        return self._score(rows, columns), (rows, columns)
+
+    @staticmethod
+    def _score(rows, columns):
+        number_of_pegs = sum(rows)
+        return (_pair_distance(rows) + _pair_distance(columns)) / number_of_pegs
+
+    def __call__(self, board):
+        return self.evaluate(board)[0]
+
+
+def _line_counts(board):
+    """
+    :return: (rows, columns): the number of pegs in each row and in each column of the board
+    """
+    rows = [0] * board.size
+    columns = [0] * board.size
+    for cell in cells_of(board.pegs):
+        r, c = divmod(cell, board.size)
+        rows[r] += 1
+        columns[c] += 1
+    return rows, columns
+
+
+def _pair_distance(counts):
+    """
+    :param counts: the number of pegs at each position along one axis
+    :return: the sum of distances along that axis over every unordered pair of pegs
+    """
+    total = 0
+    seen = 0
+    seen_positions = 0
+    for position, count in enumerate(counts):
+        total += count * (seen * position - seen_positions)
+        seen += count
+        seen_positions += count * position
+    return total
+
+
+_INCREMENTAL = {
+    max_moves: IncrementalMobility(_max_moves_score),
+    min_moves: IncrementalMobility(_min_moves_score),
+    max_movable_pegs: IncrementalMobility(_max_movable_pegs_score),
+    manhattan_distance: IncrementalManhattanDistance(),
+}
+
+
+def incremental(heuristic):
+    """
+    :return: the incremental version of one of the heuristics in this module
+    """
+    # Look through any wrapper (such as instrumentation's timers) to the function itself
+    return _INCREMENTAL[getattr(heuristic, '__wrapped__', heuristic)]
+
+
+class Weighted:
+    """
+    A heuristic multiplied by weight, for weighted A*: with a weight above 1 the search trusts the heuristic more than
+    the path so far and dives towards boards that look close to solved. With noise set, every score is also multiplied
+    by a random factor in [1 - noise, 1 + noise], so repeated searches break near ties differently.
+
+    Wraps plain and incremental heuristics alike, keeping their interface.
+    """
+
+    def __init__(self, heuristic, weight=1.0, noise=0.0, random=None):
+        self.heuristic = heuristic
+        self.weight = weight
+        self.noise = noise
+        self.random = random
+
+    def evaluate(self, board):
+        h, state = self.heuristic.evaluate(board)
+        return self._scale(h), state
+
+    def update(self, state, move, child):
+        h, child_state = self.heuristic.update(state, move, child)
+        return self._scale(h), child_state
+
+    def _scale(self, h):
+        if self.noise:
+            return h * self.weight * self.random.uniform(1 - self.noise, 1 + self.noise)
+        return h * self.weight
+
+    def __call__(self, board):
+        return self._scale(self.heuristic(board))
@@ -0,0 +1,103 @@
+import threading
+
+from budget import BudgetExceeded
+from counting import SolutionCounter
+from pruning import Pruner
+
+
+class _Interrupt:
+    """
+    Stands in for a Budget in the hint engine's SolutionCounter, stopping the count as soon as the engine is asked
+    about a different board. A stopped count loses only the boards it had not finished: every finished one stays in
+    the counter's memo.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+
+    def charge(self, path=None, nodes=1):
+        if self.event.is_set():
+            raise BudgetExceeded('interrupted')
+
+
+class HintEngine:
+    """
+    Tells a player which moves keep the game solvable and how many solutions each leaves, without ever making them
+    wait for a search.
+
+    A background thread counts the solutions of the board the player is looking at, starting as soon as the engine is
+    made. Counting a board counts every board below it, and the counts are memoised per canonical board, so once the
+    current board is counted every move's answer is a dictionary lookup, and so is every later turn's. When the player
+    moves before the count is done, the thread drops the old board and starts on the new one, keeping everything it
+    had already finished.
+    """
+
+    def __init__(self, board, prune=True):
+        """
+        :param prune: let the counter skip boards that Pruner proves unsolvable, which leaves the counts unchanged
+        """
+        self.geometry = board.geometry
+        self.interrupt = _Interrupt()
+        self.counter = SolutionCounter(board, Pruner(self.geometry) if prune else None, self.interrupt)
+        self.target = board.pegs
+        self.done = None
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def solutions(self, pegs):
+        """
+        :return: the number of solutions from the board, or None if it has not been counted yet
+        """
+        result = self.counter.memo.get(self.geometry.canonical(pegs))
+        return result[0] if result is not None else None
+
+    def hints(self, board, wait=0.05):
+        """
+        Points the background count at board, waiting at most wait seconds for it to finish.
+
+        :return: (solutions, moves): the number of solutions from board and a list of (move, solutions) for each of
+        its legal moves, with None for any count that is not ready yet
+        """
+        self.focus(board)
+        with self.condition:
+            self.condition.wait_for(lambda: self.done == board.pegs, wait)
+
+        jumps = self.geometry.jumps
+        moves = [(jumps[index][0], self.solutions(board.pegs ^ jumps[index][1]))
+                 for index in self.geometry.legal_jumps(board.pegs)]
+        return self.solutions(board.pegs), moves
+
+    def focus(self, board):
+        """
+        Makes board the one the background thread counts next, interrupting the count in progress.
+        """
+        with self.condition:
+            if board.pegs != self.target:
+                self.target = board.pegs
+                self.interrupt.event.set()
+                self.condition.notify_all()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.interrupt.event.set()
+            self.condition.notify_all()
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.closed or self.done != self.target)
+                if self.closed:
+                    return
+                target = self.target
+                self.interrupt.event.clear()
+            try:
+                self.counter.count(target)
+            except BudgetExceeded:
+                continue
+            with self.condition:
+                self.done = target
+                self.condition.notify_all()
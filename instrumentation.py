@@ -0,0 +1,174 @@
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from functools import wraps
+
+
+def _targets():
+    """
+    :return: (phase, owner, attribute) for every function Instrumentation times
+    """
+    import analysis
+    import bitboard
+    import board
+    import database
+    import external
+    import heuristic
+    import priority_queue
+    import pruning
+    import tablebase
+    import visited
+
+    targets = [('move generation', analysis.Analysis, '__init__'),
+               ('board copies', board.Board, 'make_move'),
+               # BitBoard.successors builds its children directly rather than through make_move
+               ('board copies', bitboard.BitBoard, '__init__'),
+               ('duplicate checks', visited.VisitedSet, 'visit'),
+               ('duplicate checks', visited.BloomVisitedSet, 'visit'),
+               ('duplicate checks', external.ExternalVisitedSet, 'visit'),
+               ('pruning', pruning.Pruner, 'viable'),
+               ('lookups', tablebase.Tablebase, 'lookup'),
+               ('lookups', database.PositionDatabase, 'lookup')]
+    for name in ('max_moves', 'min_moves', 'max_movable_pegs', 'manhattan_distance'):
+        targets.append(('heuristic', heuristic, name))
+    for cls in (heuristic.IncrementalMobility, heuristic.IncrementalManhattanDistance):
+        targets += [('heuristic', cls, 'evaluate'), ('heuristic', cls, 'update')]
+    for cls in (priority_queue.PriorityQueue, priority_queue.BucketPriorityQueue, external.ExternalPriorityQueue):
+        targets += [('queue push', cls, 'put'), ('queue pop', cls, 'get')]
+    targets += [('queue push', external.ExternalQueue, 'append'), ('queue pop', external.ExternalQueue, 'popleft')]
+    return targets
+
+
+class Instrumentation:
+    """
+    Per-phase call counts and times for the hot paths of the searchers.
+
+    While installed, every function listed in _targets is replaced by a wrapper that times it; uninstalling puts the
+    originals back, so the searchers run untouched code whenever instrumentation is off. Times are inclusive: a
+    heuristic that analyses its board counts that time under both heuristic and move generation.
+    """
+
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self._originals = []
+
+    def install(self):
+        for phase, owner, name in _targets():
+            original = getattr(owner, name)
+            self._originals.append((owner, name, original))
+            setattr(owner, name, self._timed(phase, original))
+
+    def uninstall(self):
+        for owner, name, original in reversed(self._originals):
+            setattr(owner, name, original)
+        self._originals = []
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.uninstall()
+
+    def _timed(self, phase, function):
+        calls = self.calls
+        seconds = self.seconds
+        clock = time.perf_counter
+
+        @wraps(function)
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds[phase] += clock() - start
+                calls[phase] += 1
+        return timed
+
+    def report(self, f):
+        for phase in sorted(self.seconds, key=self.seconds.get, reverse=True):
+            print('Phase {}: {} calls, {:.4f} seconds'.format(phase, self.calls[phase], self.seconds[phase]), file=f)
+
+
+class Progress:
+    """
+    Prints a line about the running search to stderr every interval seconds, from a background thread: nodes visited and
+    the rate since the last line, the frontier size, and the A* f-value, IDA* bound or layer depth where the search has
+    one.
+    """
+
+    def __init__(self, interval, out=sys.stderr):
+        self.interval = interval
+        self.out = out
+        self.seeker = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def watch(self, seeker):
+        self.seeker = seeker
+        self.start = self._last_time = time.time()
+        self._last_nodes = 0
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            now = time.time()
+            seeker = self.seeker
+            nodes = seeker.nodes_visited
+            line = '[{:.1f}s] {} nodes ({:.0f}/s)'.format(now - self.start, nodes,
+                                                          (nodes - self._last_nodes) / (now - self._last_time))
+            frontier = getattr(seeker, 'frontier', None)
+            line += ', frontier {}'.format(len(frontier) if frontier is not None else seeker.space)
+            if getattr(frontier, 'bound', None) is not None:
+                line += ', f {:.4g}'.format(frontier.bound)
+            if getattr(seeker, 'bound', None) is not None:
+                line += ', bound {:.4g}'.format(seeker.bound)
+            if getattr(seeker, 'layers', None):
+                line += ', depth {}'.format(len(seeker.layers) - 1)
+            print(line, file=self.out, flush=True)
+            self._last_time, self._last_nodes = now, nodes
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler: a background thread records the stack of the profiled thread every interval seconds. write()
+    saves the samples in the folded format flame graph tools read, one 'outer;...;inner count' line per stack.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self._target = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._target = threading.get_ident()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('{} ({}:{})'.format(code.co_name, code.co_filename.split('/')[-1], code.co_firstlineno))
+                frame = frame.f_back
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def write(self, file_name):
+        with open(file_name, 'w') as f:
+            for stack, count in self.samples.most_common():
+                print(stack, count, file=f)
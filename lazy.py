@@ -0,0 +1,19 @@
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """
+    :return: the module called name, which is only actually imported the first time one of its attributes is used, so
+    a run that never touches it never pays for importing it
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,43 @@
+class Path:
+    """
+    A sequence of moves stored as a pointer to the move before it.
+
+    Extending a path allocates one small node instead of copying every earlier move, and paths that share a prefix
+    share its nodes. The move list is only rebuilt with moves() once a search has something to report.
+    """
+    __slots__ = ('move', 'parent', 'depth')
+
+    def __init__(self, move=None, parent=None):
+        self.move = move
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent is not None else 0
+
+    @classmethod
+    def from_moves(cls, moves):
+        path = cls()
+        for move in moves:
+            path = path.extend(move)
+        return path
+
+    def extend(self, move):
+        """
+        :return: a new path ending with move; this path is left unchanged
+        """
+        return Path(move, self)
+
+    def moves(self):
+        """
+        :return: the list of (source, destination) moves from the start of the search to the end of this path
+        """
+        moves = [None] * self.depth
+        node = self
+        while node.parent is not None:
+            moves[node.depth - 1] = node.move
+            node = node.parent
+        return moves
+
+    def __len__(self):
+        return self.depth
+
+    def __iter__(self):
+        return iter(self.moves())
@@ -1,4 +1,5 @@
 import heapq
+import sys
 
 
 class PriorityQueue:
@@ -14,13 +15,21 @@ class PriorityQueue:
     def __init__(self, heuristic):
         self.heap = []
         self.heuristic = heuristic
+        # The f-value of the entry most recently taken out, which in A* only ever grows
+        self.bound = None
 
-    def put(self, board_path_tup):
+    def put(self, board_path_tup, h=None):
+        """
+        :param h: the board's heuristic value, if the caller already knows it
+        """
         board, path = board_path_tup
-        heapq.heappush(self.heap, PriorityQueue.BoardPathPair(board, path, self.heuristic(board) + len(path)))
+        if h is None:
+            h = self.heuristic(board)
+        heapq.heappush(self.heap, PriorityQueue.BoardPathPair(board, path, h + len(path)))
 
     def get(self):
         board_path = heapq.heappop(self.heap)
+        self.bound = board_path.value
         return board_path.board, board_path.path
 
     def empty(self):
@@ -28,3 +37,88 @@ class PriorityQueue:
 
     def __len__(self):
         return len(self.heap)
+
+
+class BucketPriorityQueue:
+    """
+    Priority queue for A* that files entries into buckets keyed by an integer priority.
+
+    f-values are quantised to multiples of resolution and combined with the path length into one integer key, so that
+    among equal f-values the deepest entry comes out first. Entries are plain (board, path) tuples held in a list per
+    key, and a heap of the distinct keys in use finds the next bucket, so no Python comparison methods are ever called.
+
+    With lazy set, the heuristic is not run when an entry is put. The entry is filed under the f-value of the entry
+    most recently taken out (its parent, in A*) and only scored when it reaches the front. If its real f-value is
+    worse it is filed again under that value.
+    """
+
+    def __init__(self, heuristic, lazy=False, resolution=1e-6, max_depth=1024):
+        self.heuristic = heuristic
+        self.lazy = lazy
+        self.resolution = resolution
+        self.max_depth = max_depth
+        self.buckets = {}
+        self.keys = []
+        self.size = 0
+        self.current = 0
+
+    def put(self, board_path_tup, h=None):
+        """
+        :param h: the board's heuristic value, if the caller already knows it
+        """
+        board, path = board_path_tup
+        if h is not None:
+            self._push(self._f_key(h + len(path)), (board, path, True))
+        elif self.lazy:
+            self._push(self.current, (board, path, False))
+        else:
+            self._push(self._f_key(self.heuristic(board) + len(path)), (board, path, True))
+
+    def get(self):
+        while True:
+            key = self.keys[0]
+            bucket = self.buckets[key]
+            board, path, scored = bucket.pop()
+            if not bucket:
+                heapq.heappop(self.keys)
+                del self.buckets[key]
+            self.size -= 1
+
+            f_key = key // (self.max_depth + 1)
+            if not scored:
+                scored_key = self._f_key(self.heuristic(board) + len(path))
+                if scored_key > f_key:
+                    self._push(scored_key, (board, path, True))
+                    continue
+                f_key = scored_key
+
+            self.current = f_key
+            return board, path
+
+    def empty(self):
+        return self.size == 0
+
+    @property
+    def bound(self):
+        """
+        The f-value of the entry most recently taken out.
+        """
+        return float('inf') if self.current == sys.maxsize else self.current * self.resolution
+
+    def _f_key(self, f):
+        if f == float('inf'):
+            return sys.maxsize
+        return int(round(f / self.resolution))
+
+    def _push(self, f_key, entry):
+        # Deeper paths get smaller keys within the same f-value
+        key = f_key * (self.max_depth + 1) + self.max_depth - len(entry[1])
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = []
+            heapq.heappush(self.keys, key)
+        bucket.append(entry)
+        self.size += 1
+
+    def __len__(self):
+        return self.size
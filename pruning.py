@@ -0,0 +1,208 @@
+from collections import deque
+
+from lazy import lazy_import
+
+np = lazy_import('numpy')
+
+
+class Pruner:
+    """
+    Spots boards that can never be reduced to a single peg, so searches can drop them as soon as they are generated.
+
+    Three kinds of test are worked out from the board's geometry:
+
+    * Peg types. A jump moves a peg two cells, so a peg never leaves its (r mod 2, c mod 2) type, and it can only be
+      removed by a peg of a type one step away. Once a type has lost all the types that could jump it, its pegs are
+      stuck for good, which is fatal if there are two of them or two such types.
+    * Position classes. Colour every cell (a * r + b * c) mod 3, for each (a, b) that gives the three cells of every
+      jump three different colours. Each jump then flips the parity of all three colour counts, so the parities of
+      n0 + n1 and n1 + n2 never change. A board can only finish on a cell whose one-peg board has the same parities.
+    * Pagoda functions. For each cell t, weight every cell by a Fibonacci number that shrinks with its distance from t.
+      No jump can raise the total weight of the pegs, so a board whose total is below the weight of t itself can never
+      finish with its last peg on t.
+
+    A board is kept if some cell allowed by its position class passes its pagoda test. Every test is a sum of per-cell
+    weights over the pegs, read eight cells at a time from byte lookup tables.
+    """
+
+    def __init__(self, geometry):
+        self.geometry = geometry
+        self.checked = 0
+        self.pruned = 0
+
+        cells = [i for i, (r, c) in enumerate(geometry.coords) if geometry._playable(r, c)]
+        self._types = self._peg_types(cells)
+        self._class_tables = [[self._tables(colour) for colour in colouring] for colouring in self._colourings()]
+
+        # The pagoda test for every cell, grouped by the position class of the one-peg board on that cell
+        self._targets = {}
+        for cell in cells:
+            weights = self._pagoda(cell)
+            signature = self.signature(1 << cell)
+            self._targets.setdefault(signature, []).append((self._tables(weights), weights[cell], cell))
+        self._array_tables = None
+
+    def signature(self, pegs):
+        """
+        :return: the position class of a board, as a tuple of parities
+        """
+        signature = []
+        for tables in self._class_tables:
+            n0, n1, n2 = (_weigh(colour, pegs) for colour in tables)
+            signature += [(n0 + n1) % 2, (n1 + n2) % 2]
+        return tuple(signature)
+
+    def viable(self, pegs):
+        """
+        :return: False if the board provably cannot be solved
+        """
+        stuck = False
+        for mask, hunters in self._types:
+            type_pegs = pegs & mask
+            if type_pegs and not pegs & hunters:
+                if stuck or type_pegs & (type_pegs - 1):
+                    return False
+                stuck = True
+
+        for tables, threshold, _ in self._targets.get(self.signature(pegs), ()):
+            if _weigh(tables, pegs) >= threshold:
+                return True
+        return False
+
+    def filter(self, successors):
+        """
+        Passes on the (move, board) pairs of successors whose boards are still viable, counting the ones dropped.
+        """
+        for move, board in successors:
+            self.checked += 1
+            if self.viable(board.pegs):
+                yield move, board
+            else:
+                self.pruned += 1
+
+    def viable_array(self, keys):
+        """
+        Vectorised viable: maps a uint64 array of board bitmasks to a boolean array.
+        """
+        if self._array_tables is None:
+            self._array_tables = (
+                [[_array_tables(colour) for colour in tables] for tables in self._class_tables],
+                {signature: [(_array_tables(tables), threshold) for tables, threshold, _ in targets]
+                 for signature, targets in self._targets.items()})
+        class_tables, targets = self._array_tables
+
+        stuck = np.zeros(keys.shape, dtype=np.int64)
+        viable = np.ones(keys.shape, dtype=bool)
+        for mask, hunters in self._types:
+            type_pegs = keys & np.uint64(mask)
+            is_stuck = (type_pegs != 0) & ((keys & np.uint64(hunters)) == 0)
+            viable &= ~(is_stuck & ((type_pegs & (type_pegs - np.uint64(1))) != 0))
+            stuck += is_stuck
+        type_ok = viable & (stuck <= 1)
+
+        signatures = []
+        for tables in class_tables:
+            n0, n1, n2 = (_weigh_array(colour, keys) for colour in tables)
+            signatures += [(n0 + n1) % 2, (n1 + n2) % 2]
+
+        viable = np.zeros(keys.shape, dtype=bool)
+        for signature, signature_targets in targets.items():
+            in_class = np.ones(keys.shape, dtype=bool)
+            for parity, expected in zip(signatures, signature):
+                in_class &= parity == expected
+            for tables, threshold in signature_targets:
+                viable |= in_class & (_weigh_array(tables, keys) >= threshold)
+        viable &= type_ok
+
+        self.checked += keys.size
+        self.pruned += int(keys.size - np.count_nonzero(viable))
+        return viable
+
+    def _peg_types(self, cells):
+        """
+        :return: (mask, hunters) for every peg type, where hunters masks the cells of every type that can jump it
+        """
+        size = self.geometry.size
+        masks = {}
+        for cell in cells:
+            r, c = divmod(cell, size)
+            masks[(r % 2, c % 2)] = masks.get((r % 2, c % 2), 0) | 1 << cell
+
+        types = []
+        for (tr, tc), mask in sorted(masks.items()):
+            hunters = 0
+            for dr, dc in self.geometry.deltas:
+                hunters |= masks.get(((tr - dr) % 2, (tc - dc) % 2), 0)
+            types.append((mask, hunters))
+        return types
+
+    def _colourings(self):
+        """
+        :return: for every valid (a, b) colouring, the indicator weights of its three colours
+        """
+        colourings = []
+        for a, b in ((1, 0), (0, 1), (1, 1), (1, 2)):
+            if any((a * dr + b * dc) % 3 == 0 for dr, dc in self.geometry.deltas):
+                continue
+            colourings.append([[int((a * r + b * c) % 3 == colour) for r, c in self.geometry.coords]
+                               for colour in range(3)])
+        return colourings
+
+    def _pagoda(self, target):
+        """
+        Weights cell x by F(K - d(x)), where d is the number of single steps from target, F the Fibonacci numbers and K
+        two more than the furthest distance. A jump towards target moves a peg from distance d + 2 over d + 1 onto d,
+        and F(K - d) = F(K - d - 1) + F(K - d - 2), so the total can never go up. Every other jump loses weight.
+        """
+        geometry = self.geometry
+        size = geometry.size
+        steps = set(geometry.deltas) | {(-dr, -dc) for dr, dc in geometry.deltas}
+        distance = {target: 0}
+        queue = deque([target])
+        while queue:
+            cell = queue.popleft()
+            r, c = divmod(cell, size)
+            for dr, dc in steps:
+                if geometry._playable(r + dr, c + dc):
+                    neighbour = (r + dr) * size + c + dc
+                    if neighbour not in distance:
+                        distance[neighbour] = distance[cell] + 1
+                        queue.append(neighbour)
+
+        furthest = max(distance.values())
+        fibonacci = [1, 1]
+        while len(fibonacci) < furthest + 3:
+            fibonacci.append(fibonacci[-1] + fibonacci[-2])
+        return [fibonacci[furthest + 2 - distance[i]] if i in distance else 0 for i in range(size * size)]
+
+    def _tables(self, weights):
+        tables = []
+        for offset in range(0, len(weights), 8):
+            table = [0] * 256
+            for value in range(1, 256):
+                low = value & -value
+                bit = offset + low.bit_length() - 1
+                table[value] = table[value ^ low] + (weights[bit] if bit < len(weights) else 0)
+            tables.append(table)
+        return tables
+
+
+def _weigh(tables, pegs):
+    total = 0
+    for table in tables:
+        if not pegs:
+            break
+        total += table[pegs & 255]
+        pegs >>= 8
+    return total
+
+
+def _array_tables(tables):
+    return [np.array(table, dtype=np.int64) for table in tables]
+
+
+def _weigh_array(tables, keys):
+    total = np.zeros(keys.shape, dtype=np.int64)
+    for chunk, table in enumerate(tables):
+        total += table[((keys >> np.uint64(8 * chunk)) & np.uint64(255)).astype(np.intp)]
+    return total
@@ -1,213 +1,1351 @@
-import sys
+import argparse
+import cProfile
+import heapq
+import itertools
+import json
+import queue
+import random
 import time
+from collections import deque
+from contextlib import ExitStack
 
+import analysis
+import instrumentation
+from budget import Budget, BudgetExceeded
+from bitboard import BitBoard
 from board import Board
-from priority_queue import PriorityQueue
+from counting import SolutionCounter
+from database import DEAD, SOLVABLE, UNKNOWN, PositionDatabase
+from external import ExternalPriorityQueue, ExternalQueue, ExternalVisitedSet
+from lazy import lazy_import
+from paths import Path
+from pruning import Pruner
+from priority_queue import BucketPriorityQueue, PriorityQueue
+from tablebase import Tablebase
+from transposition import TranspositionTable
+from visited import BloomVisitedSet, VisitedSet
 import heuristic as heuristics
 
+# Only the searches that use these pay for importing them
+multiprocessing = lazy_import('multiprocessing')
+np = lazy_import('numpy')
+sharded = lazy_import('sharded')
+
+METHODS = ['dfs', 'pdfs', 'bfs', 'lbfs', 'sharded', 'bidir', 'astar', 'beam', 'idastar', 'count', 'enumerate']
+# The heuristic functions by the names the command line uses for them
+HEURISTICS = {'max_moves': 'max_moves', 'min_moves': 'min_moves', 'max_movable_pegs': 'max_movable_pegs',
+              'man': 'manhattan_distance'}
+
+
+def expand(state, pruner=None):
+    """
+    :return: the (move, board) successors of state, without any that pruner can prove are unsolvable
+    """
+    if pruner is None:
+        return state.successors()
+    return pruner.filter(state.successors())
+
+
+def lookup(state, sources):
+    """
+    :param sources: objects with a lookup(board) method, such as a Tablebase or a PositionDatabase
+    :return: (status, moves) from the first of sources that knows whether state can be solved
+    """
+    for source in sources:
+        status, moves = source.lookup(state)
+        if status != UNKNOWN:
+            return status, moves
+    return UNKNOWN, None
+
 
 class DepthFirstSearch:
-    def __init__(self, start):
+    def __init__(self, start, pruner=None, database=None, tablebase=None, budget=None):
+        """
+        :param database: a PositionDatabase to take known results from, and to record boards whose whole subtree held
+        no solution as dead
+        :param tablebase: a Tablebase to take known results from
+        :param budget: a Budget to charge every node to
+        """
         self.start = start
+        self.pruner = pruner
+        self.database = database
+        self.budget = budget
+        self.sources = [source for source in (tablebase, database) if source is not None]
         self.nodes_visited = 0
+        self.solutions = 0
         self.space = 0
 
     def search(self, state=None, path=None, depth=1):
         self.nodes_visited += 1
+        # The deepest stack so far, which is what a search stopped by its budget reports
+        self.space = max(self.space, depth)
 
-        if not state and not path:
+        if state is None:
             state = self.start
-            path = []
+            path = Path()
+        if self.budget is not None:
+            self.budget.charge(path)
+
+        if self.sources:
+            status, moves = lookup(state, self.sources)
+            if status == DEAD:
+                return
+            if status == SOLVABLE:
+                self.solutions += 1
+                self.space = max(self.space, depth + len(moves))
+                yield path.moves() + moves
+                return
+        solutions = self.solutions
 
         if state.is_goal():
-            self.space = depth
-            yield path
+            self.solutions += 1
+            yield path.moves()
+
+        for move, board in expand(state, self.pruner):
+            yield from self.search(board, path.extend(move), depth + 1)
+
+        if self.database is not None and self.solutions == solutions:
+            self.database.record_dead(state)
+
+
+class ParallelDepthFirstSearch:
+    """
+    Depth first search spread over a pool of worker processes.
+
+    The tree is expanded up to split_depth and every board at that depth becomes a task on a shared queue. Workers
+    take tasks as they become free, and a busy worker that notices idle workers hands over the shallowest untried
+    boards from its own stack, so one large subtree can still be shared out.
+    """
+    def __init__(self, start, workers=None, split_depth=2, check_interval=256, pruner=None, database=None,
+                 tablebase=None, budget=None):
+        """
+        :param database: a PositionDatabase to take known results from
+        :param tablebase: a Tablebase to take known results from
+        :param budget: a Budget to charge every node to. Each worker gets its own share of it (see Budget.share)
+        """
+        self.start = start
+        self.pruner = pruner
+        self.database = database
+        self.budget = budget
+        self.sources = [source for source in (tablebase, database) if source is not None]
+        self.workers = workers or multiprocessing.cpu_count()
+        self.split_depth = split_depth
+        self.check_interval = check_interval
+        self.nodes_visited = 0
+        self.space = 0
+
+    def search(self):
+        tasks = []
+        stack = [(self.start, Path())]
+        while stack:
+            state, path = stack.pop()
+            self.nodes_visited += 1
+            if self.budget is not None:
+                self.budget.charge(path)
+
+            if self.sources:
+                status, moves = lookup(state, self.sources)
+                if status == DEAD:
+                    continue
+                if status == SOLVABLE:
+                    self.space = len(path) + len(moves) + 1
+                    return path.moves() + moves
+            if state.is_goal():
+                self.space = len(path) + 1
+                return path.moves()
+            if len(path) == self.split_depth:
+                tasks.append((state, path))
+                continue
+            stack.extend(reversed([(board, path.extend(move)) for move, board in expand(state, self.pruner)]))
+
+        if not tasks:
+            return None
 
-        for move, board in state.successors():
-            yield from self.search(board, path + [move], depth + 1)
+        task_queue = multiprocessing.Queue()
+        results = multiprocessing.Queue()
+        found = multiprocessing.Event()
+        pending = multiprocessing.Value('i', len(tasks))
+        idle = multiprocessing.Value('i', self.workers)
+
+        for task in tasks:
+            task_queue.put(task)
+
+        budget = self.budget.share(self.workers) if self.budget is not None else None
+        processes = [multiprocessing.Process(target=_parallel_dfs_worker,
+                                             args=(task_queue, results, found, pending, idle, self.check_interval,
+                                                   self.pruner, self.sources, budget))
+                     for _ in range(self.workers)]
+        for process in processes:
+            process.start()
+
+        solution = None
+        exceeded = None
+        for _ in processes:
+            kind, value, nodes, checked, pruned, source_counts = results.get()
+            self.nodes_visited += nodes
+            if self.budget is not None:
+                self.budget.spent += nodes
+            if self.pruner is not None:
+                self.pruner.checked += checked
+                self.pruner.pruned += pruned
+            for source, (lookups, solvable_hits, dead_hits) in zip(self.sources, source_counts):
+                source.lookups += lookups
+                source.solvable_hits += solvable_hits
+                source.dead_hits += dead_hits
+            if kind == 'solution' and solution is None:
+                solution = value
+                found.set()
+            elif kind == 'budget':
+                # One worker running out stops them all, as the others' shares end at the same deadline or soon after
+                limit, partial = value
+                exceeded = exceeded or limit
+                if len(partial) > len(self.budget.best):
+                    self.budget.best = Path.from_moves(partial)
+                found.set()
+
+        task_queue.cancel_join_thread()
+        for process in processes:
+            process.join()
+
+        if solution is not None:
+            self.space = len(solution) + 1
+        elif exceeded is not None:
+            # The deepest path charged is the deepest any worker's stack reached
+            self.space = max(self.space, len(self.budget.best) + 1)
+            # Reported against the whole budget the user gave, not the worker's share of it
+            raise self.budget.exceeded(exceeded)
+        return solution
+
+
+def _parallel_dfs_worker(tasks, results, found, pending, idle, check_interval, pruner, sources, budget):
+    """
+    Runs depth first search over tasks from the shared queue until a solution is found, every task is finished or its
+    budget runs out, then reports the number of nodes this worker visited (and its pruning and lookup counts).
+    """
+    tasks.cancel_join_thread()
+    nodes = 0
+    if pruner is not None:
+        pruner.checked = pruner.pruned = 0
+    for source in sources:
+        source.lookups = source.solvable_hits = source.dead_hits = 0
+
+    def report(kind, value):
+        counts = (pruner.checked, pruner.pruned) if pruner is not None else (0, 0)
+        source_counts = [(source.lookups, source.solvable_hits, source.dead_hits) for source in sources]
+        results.put((kind, value, nodes) + counts + (source_counts,))
+
+    while not found.is_set():
+        try:
+            start, start_path = tasks.get(timeout=0.05)
+        except queue.Empty:
+            if pending.value == 0:
+                break
+            continue
+
+        with idle.get_lock():
+            idle.value -= 1
+
+        stack = [(start, start_path)]
+        while stack:
+            state, path = stack.pop()
+            nodes += 1
+            if budget is not None:
+                try:
+                    budget.charge(path)
+                except BudgetExceeded as exceeded:
+                    report('budget', (exceeded.limit, budget.partial()))
+                    found.set()
+                    return
+
+            if sources:
+                status, moves = lookup(state, sources)
+                if status == DEAD:
+                    continue
+                if status == SOLVABLE:
+                    report('solution', path.moves() + moves)
+                    found.set()
+                    return
+            if state.is_goal():
+                report('solution', path.moves())
+                found.set()
+                return
+            stack.extend(reversed([(board, path.extend(move)) for move, board in expand(state, pruner)]))
+
+            if nodes % check_interval == 0:
+                if found.is_set():
+                    break
+
+                # Share the shallowest untried boards, which hold the most work, with any idle workers
+                share = min(idle.value, len(stack) - 1)
+                if share > 0:
+                    donated, stack[:share] = stack[:share], []
+                    with pending.get_lock():
+                        pending.value += len(donated)
+                    for task in donated:
+                        tasks.put(task)
+
+        with pending.get_lock():
+            pending.value -= 1
+        with idle.get_lock():
+            idle.value += 1
+
+    report('done', None)
 
 
 class BreadthFirstSearch:
-    def __init__(self, start, check_duplicates, check_symmetrical=False):
+    def __init__(self, start, check_duplicates, check_symmetrical=False, memory_budget=None, spill_dir=None,
+                 pruner=None, database=None, tablebase=None, budget=None, bloom_memory=None, false_positive_rate=0.001,
+                 exact_depth=0):
+        """
+        :param memory_budget: if given, the bytes of memory the frontier and the visited set may each use before they
+        start spilling to disk in spill_dir (or a temporary directory)
+        :param bloom_memory: if given, check duplicates approximately with a BloomVisitedSet of this many bytes, with
+        false_positive_rate and exact_depth, instead of remembering every board
+        :param database: a PositionDatabase to take known results from
+        :param tablebase: a Tablebase to take known results from
+        :param budget: a Budget to charge every node to
+        """
         self.start = start
+        self.pruner = pruner
+        self.database = database
+        self.budget = budget
+        self.sources = [source for source in (tablebase, database) if source is not None]
         self.check_duplicates = check_duplicates
         self.check_symmetrical = check_symmetrical
-        self.visited = []
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.bloom_memory = bloom_memory
+        self.false_positive_rate = false_positive_rate
+        self.exact_depth = exact_depth
+        self.visited = _visited_set(self)
         self.nodes_visited = 0
         self.space = 0
 
     def search(self):
-        queue = [(self.start, [])]
+        if self.memory_budget:
+            queue = ExternalQueue(self.start, self.memory_budget, self.spill_dir)
+        else:
+            queue = deque()
+        self.frontier = queue
+        queue.append((self.start, Path()))
 
         while queue:
             self.space = max(self.space, len(queue))
-            (state, path) = queue.pop(0)
+            (state, path) = queue.popleft()
             self.nodes_visited += 1
+            if self.budget is not None:
+                self.budget.charge(path)
 
-            for move, board in state.successors():
-                if self.check_duplicates and board in self.visited:
+            for move, board in expand(state, self.pruner):
+                if self.check_duplicates and not self.visited.visit(board):
                     continue
-                elif self.check_duplicates:
-                    self.visited += [board]
 
-                    if self.check_symmetrical:
-                        self.visited += board.get_symmetrically_equivalent_boards()
+                if self.sources:
+                    status, moves = lookup(board, self.sources)
+                    if status == DEAD:
+                        continue
+                    if status == SOLVABLE:
+                        yield path.extend(move).moves() + moves
+                        continue
 
                 if board.is_goal():
-                    yield path + [move]
+                    yield path.extend(move).moves()
                 else:
-                    queue.append((board, path + [move]))
+                    queue.append((board, path.extend(move)))
+
+
+class LayeredBreadthFirstSearch:
+    """
+    Breadth first search that expands a whole depth at a time.
+
+    Every solution sits at the same depth, so the search holds one layer of boards as a sorted uint64 array of
+    bitmasks and builds the next layer by testing each jump against the whole array at once. Duplicates within a
+    layer are removed with np.unique (after mapping to canonical keys when checking symmetry); a board can never
+    reappear at a different depth, so that is all the duplicate checking the search needs.
+    """
+    def __init__(self, start, check_symmetrical=False, pruner=None, tablebase=None, budget=None):
+        """
+        :param tablebase: a Tablebase used to drop every dead board from layers with few enough pegs
+        :param budget: a Budget to charge every layer's boards to. It is checked between layers and between the jumps
+        that build a layer, so a layer is never left half charged
+        """
+        self.start = start
+        self.pruner = pruner
+        self.tablebase = tablebase
+        self.budget = budget
+        self.check_symmetrical = check_symmetrical
+        self.geometry = start.geometry
+        self.layers = []
+        self.layer_stats = []
+        self.nodes_visited = 0
+        self.space = 0
+
+    def search(self):
+        jump_arrays = self.geometry.jump_arrays()
+        layer = np.array([self._key(self.start.pegs)], dtype=np.uint64)
+
+        while layer.size:
+            layer_start = time.time()
+            self.layers.append(layer)
+            self.nodes_visited += layer.size
+            self.space = max(self.space, layer.size)
+            self._charge(layer)
+
+            goals = layer[(layer != 0) & ((layer & (layer - np.uint64(1))) == 0)]
+            if goals.size:
+                self.layer_stats.append((len(self.layers) - 1, layer.size, time.time() - layer_start))
+                return self._path_to(int(goals[0]))
+
+            layer = self._filter(self._next_layer(layer, jump_arrays))
+            self.layer_stats.append((len(self.layers) - 1, self.layers[-1].size, time.time() - layer_start))
+        return None
+
+    def _next_layer(self, layer, jump_arrays, reverse=False):
+        """
+        :param jump_arrays: the geometry's jump_arrays()
+        :param reverse: apply every jump backwards, giving the boards that could have led to the layer
+        :return: the sorted, unique keys of every board one jump away from a board in layer
+        """
+        children = []
+        for jump_needed, jump_destination, jump_mask in zip(*jump_arrays):
+            if self.budget is not None:
+                self._check()
+            if reverse:
+                movable = layer[((layer & jump_destination) != 0) & ((layer & jump_needed) == 0)]
+            else:
+                movable = layer[((layer & jump_needed) == jump_needed) & ((layer & jump_destination) == 0)]
+            if movable.size:
+                children.append(movable ^ jump_mask)
+
+        layer = np.concatenate(children) if children else np.empty(0, dtype=np.uint64)
+        if self.check_symmetrical:
+            layer = self.geometry.canonical_array(layer)
+        return np.unique(layer)
+
+    def _filter(self, layer):
+        """
+        Drops the boards of the next forward layer that the pruner or the tablebase know to be dead.
+        """
+        if self.pruner is not None:
+            layer = layer[self.pruner.viable_array(layer)]
+        if self.tablebase is not None and self.start.peg_count() - len(self.layers) <= self.tablebase.max_pegs:
+            canonical = layer if self.check_symmetrical else self.geometry.canonical_array(layer)
+            solvable = self.tablebase.contains_array(canonical)
+            self.tablebase.lookups += layer.size
+            self.tablebase.dead_hits += int(layer.size - np.count_nonzero(solvable))
+            layer = layer[solvable]
+        return layer
+
+    def _charge(self, layer):
+        if self.budget is not None:
+            self._check(lambda: self.budget.charge(nodes=layer.size))
+
+    def _check(self, check=None):
+        """
+        Runs the budget's check (or the given one), taking the path to a board of the deepest forward layer as the
+        best partial result if it fails.
+        """
+        try:
+            (check or self.budget.check)()
+        except BudgetExceeded:
+            if len(self.layers) - 1 > len(self.budget.best):
+                self.budget.best = Path.from_moves(self._path_to(int(self.layers[-1][0])))
+            raise
+
+    def _key(self, pegs):
+        return self.geometry.canonical(pegs) if self.check_symmetrical else pegs
+
+    def _path_to(self, goal):
+        """
+        Rebuilds a path to a goal found in the last layer. Walking back through the layers finds the key of one
+        ancestor per depth, then replaying from the start picks the actual move that reaches each of those keys.
+        """
+        jumps = self.geometry.jumps
+        keys = [goal]
+        for layer in reversed(self.layers[:-1]):
+            for index in self.geometry.reverse_jumps(keys[-1]):
+                parent = np.uint64(self._key(keys[-1] ^ jumps[index][1]))
+                position = np.searchsorted(layer, parent)
+                if position < layer.size and layer[position] == parent:
+                    keys.append(int(parent))
+                    break
+
+        path = []
+        pegs = self.start.pegs
+        for key in reversed(keys[:-1]):
+            for index in self.geometry.legal_jumps(pegs):
+                move, jump_mask, _, _ = jumps[index]
+                if self._key(pegs ^ jump_mask) == key:
+                    path.append(move)
+                    pegs ^= jump_mask
+                    break
+        return path
+
+
+class BidirectionalSearch(LayeredBreadthFirstSearch):
+    """
+    Meet in the middle search.
+
+    Every solution takes exactly one jump per peg removed, so the search grows layers of boards forward from the start
+    and backward, with reverse jumps, from every one-peg goal. It always grows the smaller side, and stops once the two
+    newest layers hold the same number of pegs: any board in both lies on a solution. Each side only has to reach
+    about half the solution depth.
+
+    The forward half of the path is rebuilt as in LayeredBreadthFirstSearch. Every board in a backward layer can
+    reach the layer below it, so the second half is found by always jumping to a board in the next backward layer.
+    """
+    def __init__(self, start, check_symmetrical=False, pruner=None, tablebase=None, budget=None):
+        super().__init__(start, check_symmetrical, pruner, tablebase, budget)
+        self.backward_layers = []
+        self.backward_layer_stats = []
+
+    def search(self):
+        jump_arrays = self.geometry.jump_arrays()
+        geometry = self.geometry
+        pegs = self.start.peg_count()
+        forward = np.array([self._key(self.start.pegs)], dtype=np.uint64)
+        # Only goals in the start's position class can be reached from it (see Pruner)
+        classes = Pruner(geometry)
+        goals = [1 << cell for cell in range(geometry.size * geometry.size) if geometry.cells >> cell & 1]
+        backward = np.unique(np.array([self._key(goal) for goal in goals
+                                       if classes.signature(goal) == classes.signature(self.start.pegs)],
+                                      dtype=np.uint64))
+        self._add_layer(self.layers, self.layer_stats, forward, time.time())
+        self._add_layer(self.backward_layers, self.backward_layer_stats, backward, time.time())
+
+        # Forward layer i holds boards with pegs - i pegs, backward layer j boards with j + 1
+        while pegs - (len(self.layers) - 1) > len(self.backward_layers):
+            if not forward.size or not backward.size:
+                return None
+            layer_start = time.time()
+            if forward.size <= backward.size:
+                forward = self._filter(self._next_layer(forward, jump_arrays))
+                self._add_layer(self.layers, self.layer_stats, forward, layer_start)
+            else:
+                backward = self._next_layer(backward, jump_arrays, reverse=True)
+                self._add_layer(self.backward_layers, self.backward_layer_stats, backward, layer_start)
+
+        meeting = np.intersect1d(forward, backward, assume_unique=True)
+        if pegs == 0 or not meeting.size:
+            return None
+
+        path = self._path_to(int(meeting[0]))
+        pegs = self.start.pegs
+        for move in path:
+            pegs ^= geometry.jumps[geometry.jump_index[move]][1]
+        return path + self._path_from(pegs)
+
+    def _add_layer(self, layers, layer_stats, layer, layer_start):
+        layers.append(layer)
+        self.nodes_visited += layer.size
+        self.space = max(self.space, layer.size)
+        if layer.size:
+            self._charge(layer)
+        layer_stats.append((len(layers) - 1, layer.size, time.time() - layer_start))
+
+    def _path_from(self, pegs):
+        """
+        :param pegs: a board whose key is in the newest backward layer
+        :return: the moves that take it down through the backward layers to a goal
+        """
+        jumps = self.geometry.jumps
+        path = []
+        for layer in reversed(self.backward_layers[:-1]):
+            for index in self.geometry.legal_jumps(pegs):
+                move, jump_mask, _, _ = jumps[index]
+                key = np.uint64(self._key(pegs ^ jump_mask))
+                position = np.searchsorted(layer, key)
+                if position < layer.size and layer[position] == key:
+                    path.append(move)
+                    pegs ^= jump_mask
+                    break
+        return path
 
 
 class AStar:
-    def __init__(self, start, heuristic, check_duplicates, check_symmetrical=False):
+    def __init__(self, start, heuristic, check_duplicates, check_symmetrical=False, memory_budget=None,
+                 spill_dir=None, bucket_queue=False, lazy_heuristic=False, incremental=False, pruner=None,
+                 database=None, tablebase=None, budget=None, restarts=0, restart_nodes=None, bloom_memory=None,
+                 false_positive_rate=0.001, exact_depth=0):
+        """
+        :param memory_budget: if given, the bytes of memory the frontier and the visited set may each use before they
+        start spilling to disk in spill_dir (or a temporary directory)
+        :param bloom_memory: if given, check duplicates approximately with a BloomVisitedSet of this many bytes, with
+        false_positive_rate and exact_depth, instead of remembering every board
+        :param bucket_queue: use a BucketPriorityQueue (deepest first among equal f-values) instead of a binary heap
+        :param lazy_heuristic: with bucket_queue, only run the heuristic on boards as they reach the front of the queue
+        :param incremental: heuristic is incremental (see heuristic.incremental), so each child is scored by updating
+        its parent's score with the move rather than from scratch
+        :param database: a PositionDatabase to take known results from
+        :param tablebase: a Tablebase to take known results from
+        :param budget: a Budget to charge every node to
+        :param restarts: with restart_nodes, the number of times to give up on the search after restart_nodes nodes
+        and start again from scratch, doubling restart_nodes each time. The last attempt runs to the end. Restarts only
+        help with a heuristic that scores differently each time, such as a heuristic.Weighted with noise
+        """
         self.start = start
+        self.pruner = pruner
+        self.database = database
+        self.budget = budget
+        self.restarts = restarts
+        self.restart_nodes = restart_nodes
+        self.sources = [source for source in (tablebase, database) if source is not None]
         self.heuristic = heuristic
+        self.bucket_queue = bucket_queue
+        self.lazy_heuristic = lazy_heuristic
+        self.incremental = incremental
         self.check_duplicates = check_duplicates
         self.check_symmetrical = check_symmetrical
-        self.visited = []
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.bloom_memory = bloom_memory
+        self.false_positive_rate = false_positive_rate
+        self.exact_depth = exact_depth
+        self.visited = _visited_set(self)
+        self.restarted = 0
         self.nodes_visited = 0
         self.space = 0
 
     def search(self):
-        pq = PriorityQueue(self.heuristic)
-        pq.put((self.start, []))
-        while not pq.empty():
-            self.space = max(self.space, len(pq))
+        node_limit = self.restart_nodes
+        for attempt in range(self.restarts + 1):
+            if attempt:
+                self.visited = _visited_set(self)
+                self.restarted += 1
+                node_limit *= 2
+            limit = node_limit if node_limit and attempt < self.restarts else None
 
-            state, path = pq.get()
-            self.nodes_visited += 1
+            if self.memory_budget:
+                pq = ExternalPriorityQueue(self.heuristic, self.start, self.memory_budget, self.spill_dir)
+            elif self.bucket_queue:
+                pq = BucketPriorityQueue(self.heuristic, self.lazy_heuristic, max_depth=self.start.peg_count())
+            else:
+                pq = PriorityQueue(self.heuristic)
+            self.frontier = pq
+            pq.put((self.start, Path()))
+            expanded = 0
+            while not pq.empty():
+                if expanded == limit:
+                    break
+                expanded += 1
+                self.space = max(self.space, len(pq))
 
-            if state.is_goal():
-                yield path
-            for move, board in state.successors():
-                if self.check_duplicates and board in self.visited:
-                    continue
-                elif self.check_duplicates:
-                    self.visited += [board]
+                state, path = pq.get()
+                self.nodes_visited += 1
+                if self.budget is not None:
+                    self.budget.charge(path)
+
+                if self.sources:
+                    status, moves = lookup(state, self.sources)
+                    if status == DEAD:
+                        continue
+                    if status == SOLVABLE:
+                        yield path.moves() + moves
+                        continue
+                if state.is_goal():
+                    yield path.moves()
+                if self.incremental:
+                    _, score_state = self.heuristic.evaluate(state)
+
+                for move, board in expand(state, self.pruner):
+                    if self.check_duplicates and not self.visited.visit(board):
+                        continue
+
+                    if self.incremental:
+                        h, _ = self.heuristic.update(score_state, move, board)
+                        pq.put((board, path.extend(move)), h)
+                    else:
+                        pq.put((board, path.extend(move)))
+            else:
+                # The whole space was searched, so a restart could find nothing more
+                return
+
+
+def _visited_set(seeker):
+    """
+    :return: a new visited set for a BreadthFirstSearch or AStar, of the kind its options ask for
+    """
+    if seeker.bloom_memory:
+        return BloomVisitedSet(seeker.bloom_memory, seeker.false_positive_rate, seeker.check_symmetrical,
+                               seeker.exact_depth, seeker.start.peg_count())
+    if seeker.memory_budget:
+        return ExternalVisitedSet(seeker.memory_budget, seeker.check_symmetrical, seeker.spill_dir)
+    return VisitedSet(seeker.check_symmetrical)
 
-                    if self.check_symmetrical:
-                        self.visited += board.get_symmetrically_equivalent_boards()
 
-                pq.put((board, path + [move]))
+class BeamSearch:
+    """
+    Beam search: breadth first search that keeps only the width best boards of each depth.
+
+    Every board at one depth has the same number of pegs, so boards are ranked by the heuristic alone. The frontier
+    never holds more than width boards and the search never goes deeper than the number of pegs, so time and memory
+    are bounded however big the board is. The price is completeness: a beam can drop every board that leads to a
+    solution and run dry.
+
+    When that happens the search restarts with twice the width, up to restarts times. per_parent keeps the beam
+    diverse by taking at most that many children from any one board, and a heuristic.Weighted with noise makes each
+    restart rank near ties differently.
+    """
+    def __init__(self, start, heuristic, width=1000, check_symmetrical=False, pruner=None, database=None,
+                 tablebase=None, budget=None, restarts=0, per_parent=None):
+        """
+        :param database: a PositionDatabase to take known results from
+        :param tablebase: a Tablebase to take known results from
+        :param budget: a Budget to charge every node to
+        """
+        self.start = start
+        self.heuristic = heuristic
+        self.width = width
+        self.check_symmetrical = check_symmetrical
+        self.pruner = pruner
+        self.database = database
+        self.sources = [source for source in (tablebase, database) if source is not None]
+        self.budget = budget
+        self.restarts = restarts
+        self.per_parent = per_parent
+        self.restarted = 0
+        # Breaks ties between equal scores in insertion order, so the boards themselves are never compared
+        self.order = itertools.count()
+        self.layer_stats = []
+        self.nodes_visited = 0
+        self.space = 0
+
+    def search(self):
+        width = self.width
+        for attempt in range(self.restarts + 1):
+            if attempt:
+                self.restarted += 1
+                width *= 2
+            path = self._beam(width)
+            if path is not None:
+                return path
+        return None
+
+    def _beam(self, width):
+        """
+        :return: the moves of a solution found with a beam of the given width, or None if the beam ran dry
+        """
+        beam = [(self.start, Path())]
+        depth = 0
+        self.layer_stats = []
+        while beam:
+            layer_start = time.time()
+            visited = VisitedSet(self.check_symmetrical)
+            candidates = []
+            for state, path in beam:
+                self.nodes_visited += 1
+                if self.budget is not None:
+                    self.budget.charge(path)
+
+                children = []
+                for move, board in expand(state, self.pruner):
+                    if not visited.visit(board):
+                        continue
+                    if self.sources:
+                        status, moves = lookup(board, self.sources)
+                        if status == DEAD:
+                            continue
+                        if status == SOLVABLE:
+                            return path.extend(move).moves() + moves
+                    if board.is_goal():
+                        return path.extend(move).moves()
+
+                    # A board with no moves left scores infinite, and since it is not a goal it is a dead end
+                    h = self.heuristic(board)
+                    if h != float('inf'):
+                        children.append((h, next(self.order), board, path.extend(move)))
+
+                if self.per_parent is not None and len(children) > self.per_parent:
+                    children = heapq.nsmallest(self.per_parent, children)
+                candidates += children
+                self.space = max(self.space, len(candidates))
+
+            beam = [(board, path) for _, _, board, path in heapq.nsmallest(width, candidates)]
+            depth += 1
+            self.layer_stats.append((depth, len(beam), time.time() - layer_start))
+        return None
 
 
 class IterativeDeepeningAStar:
-    def __init__(self, start, heuristic):
+    def __init__(self, start, heuristic, incremental=False, pruner=None, database=None, tablebase=None,
+                 transposition_table=None, move_ordering=False, explicit_stack=False, budget=None):
+        """
+        :param incremental: heuristic is incremental (see heuristic.incremental), so each child is scored by updating
+        its parent's score with the move rather than from scratch
+        :param database: a PositionDatabase to take known results from
+        :param tablebase: a Tablebase to take known results from
+        :param transposition_table: a TranspositionTable that keeps, per canonical board, the best lower bound an
+        earlier pass proved on the cost still to pay from it, so transposed and dead subtrees are cut off at once
+        :param move_ordering: try the killer move for the depth first, then the rest by history score. A move scores
+        when it led to the cheapest child of a board, so the search goes first where the bound came closest to fitting
+        :param explicit_stack: search with a loop over an explicit stack instead of recursion, so deep boards never hit
+        Python's recursion limit
+        :param budget: a Budget to charge every node to
+        """
         self.start = start
+        self.pruner = pruner
+        self.database = database
+        self.budget = budget
+        self.sources = [source for source in (tablebase, database) if source is not None]
         self.heuristic = heuristic
+        self.incremental = incremental
+        self.table = transposition_table
+        self.move_ordering = move_ordering
+        self.explicit_stack = explicit_stack
+        self.history = {}
+        self.killers = {}
+        self.bound = None
         self.nodes_visited = 0
         self.space = 0
 
     def search(self):
-        bound = self.heuristic(self.start)
+        bound = self.bound = self.heuristic(self.start)
         while True:
-            path, cost = self.depth_limited_astar(self.start, bound, [])
+            if self.explicit_stack:
+                path, cost = self._stack_search(bound)
+            else:
+                path, cost = self.depth_limited_astar(self.start, bound, Path())
             if path is not None:
                 self.space = len(path)
-                return path
-            elif cost is float('inf'):
+                return path.moves()
+            elif cost == float('inf'):
                 return None
-            bound = cost
+            bound = self.bound = cost
 
-    def depth_limited_astar(self, node, bound, path):
-        self.nodes_visited += 1
-        cost = len(path) + self.heuristic(node)
-        if cost > bound:
-            return None, cost
-        if node.is_goal():
-            return path, cost
-        min_score = float('inf')
+    def depth_limited_astar(self, node, bound, path, score=None):
+        """
+        :param score: the node's (heuristic value, incremental state), if already known
+        """
+        found, cost, frame = self._enter(node, bound, path, score)
+        if frame is None:
+            return found, cost
 
-        for move, board in node.successors():
-            child_path, child_cost = self.depth_limited_astar(board, bound, path + [move])
+        for move, board, child_score in frame.children:
+            child_path, child_cost = self.depth_limited_astar(board, bound, path.extend(move), child_score)
             if child_path is not None:
                 return child_path, child_cost
-            min_score = min(min_score, child_cost)
-        return None, min_score
+            frame.update(move, child_cost)
+        return None, self._leave(frame)
 
+    def _stack_search(self, bound):
+        """
+        depth_limited_astar from the start board, with the recursion unrolled onto a list of frames.
+        """
+        found, cost, frame = self._enter(self.start, bound, Path(), None)
+        if frame is None:
+            return found, cost
 
-def main():
-    start_board = Board.board_from_file(sys.argv[1])
-    duplication_checks = sys.argv[2]
-    method = sys.argv[3]
+        stack = [frame]
+        while stack:
+            frame = stack[-1]
+            child = next(frame.children, None)
+            if child is None:
+                stack.pop()
+                cost = self._leave(frame)
+                if not stack:
+                    return None, cost
+                stack[-1].update(frame.move, cost)
+                continue
+
+            move, board, child_score = child
+            found, cost, child_frame = self._enter(board, bound, frame.path.extend(move), child_score)
+            if found is not None:
+                return found, cost
+            if child_frame is None:
+                frame.update(move, cost)
+            else:
+                child_frame.move = move
+                stack.append(child_frame)
+
+    def _enter(self, node, bound, path, score):
+        """
+        Visits a node.
+
+        :return: (path, cost, frame): frame is None when the node is settled without looking at its children, in which
+        case path is the solution found (or None) and cost the node's f-value
+        """
+        self.nodes_visited += 1
+        self.space = max(self.space, len(path))
+        if self.budget is not None:
+            self.budget.charge(path)
+        if self.sources:
+            status, moves = lookup(node, self.sources)
+            if status == DEAD:
+                return None, float('inf'), None
+            if status == SOLVABLE:
+                for move in moves:
+                    path = path.extend(move)
+                return path, len(path), None
+        if score is None:
+            score = self.heuristic.evaluate(node) if self.incremental else (self.heuristic(node), None)
+        h, score_state = score
+
+        # The heuristics score a board with no moves left as infinite, goals included, so goals are checked first
+        if node.is_goal():
+            return path, len(path), None
+        key = None
+        if self.table is not None:
+            key = node.canonical_key()
+            h = max(h, self.table.get(key))
+        cost = len(path) + h
+        if cost > bound:
+            return None, cost, None
+        return None, None, _Frame(node, path, key, self._children(node, score_state, len(path)))
+
+    def _children(self, node, score_state, depth):
+        successors = expand(node, self.pruner)
+        if self.move_ordering:
+            killer = self.killers.get(depth)
+            jump_index = node.geometry.jump_index
+            successors = sorted(successors, key=lambda successor: (successor[0] != killer,
+                                                                   -self.history.get(jump_index[successor[0]], 0)))
+        for move, board in successors:
+            yield move, board, self.heuristic.update(score_state, move, board) if self.incremental else None
+
+    def _leave(self, frame):
+        """
+        Records what searching a node's children showed, and returns the node's cost: the cheapest child's.
+        """
+        depth = len(frame.path)
+        if self.table is not None:
+            self.table.store(frame.key, frame.min_cost - depth, frame.node.peg_count())
+        if self.move_ordering and frame.best_move is not None:
+            index = frame.node.geometry.jump_index[frame.best_move]
+            self.history[index] = self.history.get(index, 0) + frame.node.peg_count() ** 2
+            self.killers[depth] = frame.best_move
+        return frame.min_cost
+
+
+class _Frame:
+    """
+    A board whose children IterativeDeepeningAStar is part way through.
+    """
+    __slots__ = ('node', 'path', 'key', 'children', 'move', 'min_cost', 'best_move')
+
+    def __init__(self, node, path, key, children):
+        self.node = node
+        self.path = path
+        self.key = key
+        self.children = children
+        self.move = None
+        self.min_cost = float('inf')
+        self.best_move = None
+
+    def update(self, move, cost):
+        if cost < self.min_cost:
+            self.min_cost = cost
+            self.best_move = move
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Solve a peg solitaire board.')
+    parser.add_argument('input_file', help='the board to solve, eg input_files/ortho.txt')
+    parser.add_argument('duplication_checks', help='tree-search, graph-search or symmetry')
+    parser.add_argument('method',
+                        help='dfs, pdfs (parallel dfs), bfs, lbfs (layered bfs), sharded (lbfs over worker processes), '
+                             'bidir (bidirectional), astar, idastar, beam, count (count every solution) or enumerate '
+                             '(write every solution to a file)')
+    parser.add_argument('heuristic', nargs='?', default='',
+                        help='max_moves, min_moves, max_movable_pegs or man (A*, IDA* and beam only)')
+    parser.add_argument('--bitboard', action='store_true',
+                        help='use the integer bitmask board instead of the numpy one')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes for pdfs and sharded (defaults to the number of CPUs)')
+    parser.add_argument('--split-depth', type=int, default=2,
+                        help='depth at which pdfs splits the tree into tasks')
+    parser.add_argument('--ring-size', type=int, default=1 << 16,
+                        help='keys each of the shared memory buffers between sharded workers holds')
+    parser.add_argument('--queue', choices=['heap', 'bucket'], default='heap',
+                        help='priority queue for astar: a binary heap, or integer buckets that favour the deepest path')
+    parser.add_argument('--lazy-heuristic', action='store_true',
+                        help='with --queue bucket, score boards only when they reach the front of the queue')
+    parser.add_argument('--incremental', action='store_true',
+                        help='score astar/idastar children by updating the parent score with the move')
+    parser.add_argument('--prune', action='store_true',
+                        help='drop successors that pagoda functions and peg class counts prove unsolvable')
+    parser.add_argument('--analysis-cache', type=int, default=analysis.DEFAULT_CACHE_SIZE,
+                        help='number of boards whose legal moves are kept in the shared LRU cache (0 disables it)')
+    parser.add_argument('--memory-budget', type=float, default=None,
+                        help='megabytes the bfs/astar frontier and visited set may each hold before spilling to disk')
+    parser.add_argument('--spill-dir', default=None,
+                        help='directory for spilled frontier and visited files (defaults to the system temp dir)')
+    parser.add_argument('--dedup', choices=['exact', 'bloom', 'hybrid'], default='exact',
+                        help='duplicate checks for bfs/astar: an exact visited set, a Bloom filter that may wrongly '
+                             'prune a board now and then, or exact up to --exact-depth and a Bloom filter below it')
+    parser.add_argument('--dedup-memory', type=float, default=16, metavar='MB',
+                        help='megabytes for the Bloom filter of --dedup bloom or hybrid')
+    parser.add_argument('--false-positive-rate', type=float, default=0.001,
+                        help='chance the Bloom filter takes a new board for a visited one once it is full')
+    parser.add_argument('--exact-depth', type=int, default=8,
+                        help='with --dedup hybrid, moves from the start within which duplicates are checked exactly')
+    parser.add_argument('--database', default=None,
+                        help='directory of the persistent database of solved and unsolvable boards to use and update')
+    parser.add_argument('--database-size', type=float, default=64,
+                        help='megabytes to allocate for a new database file')
+    parser.add_argument('--weight', type=float, default=1.0,
+                        help='weight of the heuristic in astar and idastar: f = g + weight * h')
+    parser.add_argument('--beam-width', type=int, default=1000,
+                        help='number of boards beam search keeps at each depth')
+    parser.add_argument('--per-parent', type=int, default=None, metavar='N',
+                        help='let beam search keep at most N children of any one board')
+    parser.add_argument('--noise', type=float, default=0.0,
+                        help='multiply astar and beam heuristic scores by a random factor within this fraction of 1')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for --noise')
+    parser.add_argument('--restarts', type=int, default=0,
+                        help='times beam search (doubling its width) or astar (after --restart-nodes nodes, doubling '
+                             'them) may start again')
+    parser.add_argument('--restart-nodes', type=int, default=None,
+                        help='nodes astar visits before giving up and restarting')
+    parser.add_argument('--transposition', type=int, default=0, metavar='N',
+                        help='give idastar a transposition table of N entries')
+    parser.add_argument('--move-ordering', action='store_true',
+                        help='make idastar try killer moves and then moves with the best history score first')
+    parser.add_argument('--explicit-stack', action='store_true',
+                        help='run idastar over an explicit stack instead of recursing')
+    parser.add_argument('--time-limit', type=float, default=None, metavar='SECONDS',
+                        help='stop the search after this many seconds and report the best partial result')
+    parser.add_argument('--node-limit', type=int, default=None, metavar='N',
+                        help='stop the search after visiting N nodes and report the best partial result')
+    parser.add_argument('--memory-limit', type=float, default=None, metavar='MB',
+                        help='stop the search once it uses this many megabytes and report the best partial result '
+                             '(pdfs splits it evenly between its workers; sharded counts its workers too)')
+    parser.add_argument('--stats', action='store_true',
+                        help='time move generation, heuristics, duplicate checks, queue operations and board copies')
+    parser.add_argument('--progress', type=float, default=None, metavar='SECONDS',
+                        help='print nodes/sec, frontier size and depth or bound to stderr at this interval')
+    parser.add_argument('--profile', default=None, metavar='FILE',
+                        help='run the search under cProfile and save the stats to FILE')
+    parser.add_argument('--sample', default=None, metavar='FILE',
+                        help='sample the stack while searching and save folded stacks (for flame graphs) to FILE')
+    parser.add_argument('--sample-interval', type=float, default=0.005,
+                        help='seconds between stack samples for --sample')
+    parser.add_argument('--tablebase', type=int, default=0, metavar='K',
+                        help='build a tablebase of every solvable board with at most K pegs before searching')
+    parser.add_argument('--results', default=None, metavar='FILE',
+                        help='also append the run to FILE as a line of JSON, which showResult.py can animate')
+    return parser.parse_args(argv)
+
+
+class Run:
+    """
+    The outcome of solve: the seeker, the path it found, how long it took and the supporting tables it used. A search
+    stopped by its budget has no path, but says why it stopped and gives the moves to the board with the fewest pegs it
+    reached.
+    """
+
+    def __init__(self, seeker, path, duration, pruner=None, database=None, tablebase=None):
+        self.seeker = seeker
+        self.path = path
+        self.duration = duration
+        self.pruner = pruner
+        self.database = database
+        self.tablebase = tablebase
+        self.solutions = None
+        self.finals = None
+        self.solutions_file = None
+        self.stopped = None
+        self.partial = None
+
+
+def check_args(args, geometry):
+    """
+    :param args: as returned by parse_args
+    :raises ValueError: if args names an unknown method or heuristic, or has an option out of its range or one the
+    board does not allow
+    """
+    if args.method not in METHODS:
+        raise ValueError('You must choose a valid search method. Exiting...')
+    if 'star' in args.method or args.method == 'beam':
+        if args.heuristic not in HEURISTICS:
+            raise ValueError('You did not pick a viable heuristic. Exiting...')
+        if not 0 <= args.noise < 1:
+            raise ValueError('The noise must be at least 0 and less than 1. Exiting...')
+    if args.dedup != 'exact' and not 0 < args.false_positive_rate < 1:
+        raise ValueError('The false positive rate must be between 0 and 1. Exiting...')
+    if args.database:
+        geometry._check_fits_uint64()
+
+
+def solve(args, start_board, cache=None, progress=None):
+    """
+    Runs the search that args (as returned by parse_args) asks for on start_board.
+
+    :param cache: a dict to keep pruners, tablebases, databases and transposition tables in between calls, so that a
+    later call on the same board shape starts with them already built (and, for the tables, already filled)
+    :param progress: an instrumentation.Progress to watch the seeker while it runs
+    :return: a Run
+    :raises ValueError: if args names an unknown method or heuristic; see check_args
+    """
+    check_args(args, start_board.geometry)
+    duplication_checks = args.duplication_checks
+    method = args.method
     heuristic = ''
     check_duplicates = 'graph' in duplication_checks or 'symmetry' in duplication_checks
     check_symmetrical = 'symmetry' in duplication_checks
+    geometry = start_board.geometry
 
-    if 'star' in method:
-        heuristic = sys.argv[4]
-
-        if heuristic == 'max_moves':
-            heuristic = heuristics.max_moves
-        elif heuristic == 'min_moves':
-            heuristic = heuristics.min_moves
-        elif heuristic == 'max_movable_pegs':
-            heuristic = heuristics.max_movable_pegs
-        elif heuristic == 'man':
-            heuristic = heuristics.manhattan_distance
-        else:
-            print('You did not pick a viable heuristic. Exiting...')
-            return
+    if 'star' in method or method == 'beam':
+        heuristic = getattr(heuristics, HEURISTICS[args.heuristic])
+        if args.incremental:
+            heuristic = heuristics.incremental(heuristic)
+        if args.weight != 1 or args.noise:
+            noise = args.noise if method != 'idastar' else 0
+            heuristic = heuristics.Weighted(heuristic, args.weight, noise, random.Random(args.seed))
 
-    start = time.time()
+    memory_budget = int(args.memory_budget * 1024 * 1024) if args.memory_budget else None
+    bloom_memory = None
+    if args.dedup != 'exact':
+        bloom_memory = int(args.dedup_memory * 1024 * 1024)
+    exact_depth = args.exact_depth if args.dedup == 'hybrid' else 0
+    pruner = database = tablebase = None
+    if args.prune:
+        pruner = _cached(cache, ('pruner', geometry), lambda: Pruner(geometry))
+    if args.database:
+        database = _cached(cache, ('database', args.database, geometry),
+                           lambda: PositionDatabase(args.database, geometry, args.database_size))
+    if args.tablebase:
+        tablebase = _cached(cache, ('tablebase', geometry, args.tablebase), lambda: Tablebase(geometry, args.tablebase))
+
+    budget = None
+    if args.time_limit is not None or args.node_limit is not None or args.memory_limit is not None:
+        budget = Budget(args.time_limit, args.node_limit, args.memory_limit)
+
+    run = Run(None, None, None, pruner, database, tablebase)
     if method == 'dfs':
-        seeker = DepthFirstSearch(start_board)
-        try:
-            path = next(seeker.search())
-        except StopIteration:
-            path = None
+        seeker = DepthFirstSearch(start_board, pruner, database, tablebase, budget)
+        search = lambda: next(seeker.search(), None)
+
+    elif method == 'pdfs':
+        seeker = ParallelDepthFirstSearch(start_board, args.workers, args.split_depth, pruner=pruner,
+                                          database=database, tablebase=tablebase, budget=budget)
+        search = seeker.search
 
     elif method == 'bfs':
-        seeker = BreadthFirstSearch(start_board, check_duplicates, check_symmetrical)
-        try:
-            path = next(seeker.search())
-        except StopIteration:
-            path = None
+        seeker = BreadthFirstSearch(start_board, check_duplicates, check_symmetrical, memory_budget, args.spill_dir,
+                                    pruner, database, tablebase, budget, bloom_memory, args.false_positive_rate,
+                                    exact_depth)
+        search = lambda: next(seeker.search(), None)
+
+    elif method == 'lbfs':
+        seeker = LayeredBreadthFirstSearch(start_board, check_symmetrical, pruner, tablebase, budget)
+        search = seeker.search
+
+    elif method == 'sharded':
+        seeker = sharded.ShardedBreadthFirstSearch(start_board, check_symmetrical, args.workers, args.ring_size, pruner,
+                                                   budget)
+        search = seeker.search
+
+    elif method == 'bidir':
+        seeker = BidirectionalSearch(start_board, check_symmetrical, pruner, tablebase, budget)
+        search = seeker.search
 
     elif method == 'astar':
-        seeker = AStar(start_board, heuristic, check_duplicates, check_symmetrical)
-        try:
-            path = next(seeker.search())
-        except StopIteration:
-            path = None
+        seeker = AStar(start_board, heuristic, check_duplicates, check_symmetrical, memory_budget, args.spill_dir,
+                       args.queue == 'bucket', args.lazy_heuristic, args.incremental, pruner, database,
+                       tablebase, budget, args.restarts, args.restart_nodes, bloom_memory, args.false_positive_rate,
+                       exact_depth)
+        search = lambda: next(seeker.search(), None)
+
+    elif method == 'beam':
+        seeker = BeamSearch(start_board, heuristic, args.beam_width, check_symmetrical, pruner, database, tablebase,
+                            budget, args.restarts, args.per_parent)
+        search = seeker.search
 
     elif method == 'idastar':
-        seeker = IterativeDeepeningAStar(start_board, heuristic)
-        path = seeker.search()
-        if not path:
-            path = None
+        table = None
+        if args.transposition:
+            # Stored bounds are in units of the heuristic, so a table is only shared between runs using the same one
+            table = _cached(cache, ('transposition', geometry, args.heuristic, args.weight, args.prune, args.tablebase,
+                                    args.transposition), lambda: TranspositionTable(args.transposition))
+        seeker = IterativeDeepeningAStar(start_board, heuristic, args.incremental, pruner, database, tablebase, table,
+                                         args.move_ordering, args.explicit_stack, budget)
+        search = lambda: seeker.search() or None
 
-    else:
-        print('You must choose a valid search method. Exiting...')
-        return
+    elif method in ('count', 'enumerate'):
+        seeker = SolutionCounter(start_board, pruner, budget)
 
+        def search():
+            run.solutions, run.finals = seeker.count()
+            if method == 'enumerate':
+                run.solutions_file = 'output_files/' + args.input_file.split('/')[-1] + '.solutions.xz'
+                seeker.write(run.solutions_file)
+            return seeker.solution()
+
+    run.seeker = seeker
+    if progress is not None:
+        progress.watch(seeker)
+    if budget is not None:
+        budget.start()
+    start = time.time()
+    try:
+        path = search()
+    except BudgetExceeded as exceeded:
+        path = None
+        run.stopped = str(exceeded)
+        run.partial = budget.partial()
+    finally:
+        if progress is not None:
+            progress.stop()
     end = time.time()
 
-    output_file = 'output_files/' + sys.argv[1].split('/')[-1]
+    # A search stopped by its budget has proved nothing either way
+    if database is not None and run.stopped is None:
+        if path:
+            database.record_solution(start_board, path)
+        elif method != 'beam' and bloom_memory is None:
+            # Every other method searches the whole space before giving up, so no solution means the start is dead.
+            # Beam search drops boards on purpose, and a Bloom filter can prune a board by mistake, so neither proves it
+            database.record_dead(start_board)
 
-    with open(output_file, 'w') as f:
-        print("-" * 30, file=f)
-        print('Search:', sys.argv[2], 'on', sys.argv[3], sys.argv[4] if len(sys.argv) > 4 else '', file=f)
-        print('Input File:', sys.argv[1], file=f)
+    run.path = path
+    run.duration = end - start
+    return run
 
-        if path:
-            print('Steps:', len(path), file=f)
-            for step in path:
-                print(step[0], '-->', step[1], file=f)
+
+def results_entry(args, run):
+    """
+    :return: the run as a dict for a results file: the board file and search, the moves of the solution (or None) and
+    how much work it took
+    """
+    return {'input_file': args.input_file, 'duplication_checks': args.duplication_checks, 'method': args.method,
+            'heuristic': args.heuristic,
+            'steps': [[list(source), list(destination)] for source, destination in run.path] if run.path else None,
+            'duration': run.duration, 'nodes_visited': run.seeker.nodes_visited, 'space': run.seeker.space,
+            'stopped': run.stopped}
+
+
+def _cached(cache, key, build):
+    if cache is None:
+        return build()
+    if key not in cache:
+        cache[key] = build()
+    return cache[key]
+
+
+def write_report(args, run, f, start_board):
+    seeker = run.seeker
+    path = run.path
+    duplication_checks = args.duplication_checks
+
+    print("-" * 30, file=f)
+    print('Search:', duplication_checks, 'on', args.method, args.heuristic, file=f)
+    print('Input File:', args.input_file, file=f)
+
+    if path:
+        print('Steps:', len(path), file=f)
+        for step in path:
+            print(step[0], '-->', step[1], file=f)
+    else:
+        print("No solution found!", file=f)
+
+    if run.stopped is not None:
+        print('Stopped:', run.stopped, file=f)
+        pegs_left = start_board.peg_count() - len(run.partial)
+        print('Best Partial: {} moves, {} pegs left'.format(len(run.partial), pegs_left), file=f)
+        for step in run.partial:
+            print(step[0], '-->', step[1], file=f)
+
+    print('Duration: {0:.4f} seconds'.format(run.duration), file=f)
+    print('Nodes Visited:', seeker.nodes_visited, file=f)
+    print('Space: {} nodes'.format(seeker.space), file=f)
+
+    if hasattr(seeker, 'visited') and ('graph' in duplication_checks or 'symmetry' in duplication_checks):
+        print('Visited Size:', len(seeker.visited), file=f)
+        visited = seeker.visited
+        if isinstance(visited, BloomVisitedSet):
+            print('Dedup: {}, a Bloom filter of {} bits with {} hashes holding {} boards (sized for {}){}'.format(
+                visited.mode, visited.size, visited.hashes, visited.added, visited.capacity,
+                ', exact within {} moves of the start'.format(visited.exact_depth) if visited.exact_depth else ''),
+                file=f)
+            print('Estimated False Positives: {:.3g} of {} boards pruned by the filter, {:.3g} rate now'.format(
+                visited.false_positives, visited.rejected, visited.current_rate()), file=f)
         else:
-            print("No solution found!", file=f)
+            print('Dedup: exact', file=f)
+
+    cache = analysis.cache_info()
+    print('Analysis Cache: {} hits, {} misses'.format(cache.hits, cache.misses), file=f)
+
+    pruner, database, tablebase = run.pruner, run.database, run.tablebase
+    if pruner is not None:
+        print('Pruned: {} of {} boards checked'.format(pruner.pruned, pruner.checked), file=f)
+
+    if getattr(seeker, 'memory_budget', None):
+        print('Spilled to disk: {} frontier boards, {} visited boards'.format(
+            seeker.frontier.spilled, getattr(seeker.visited, 'spilled', 0)), file=f)
+
+    if database is not None:
+        print('Database: {} lookups, {} solvable hits, {} dead hits, {} records written'.format(
+            database.lookups, database.solvable_hits, database.dead_hits, database.writes), file=f)
+
+    if tablebase is not None:
+        print('Tablebase: {} boards of up to {} pegs built in {:.4f} seconds, {} lookups, {} solvable hits, '
+              '{} dead hits'.format(len(tablebase), tablebase.max_pegs, tablebase.build_time, tablebase.lookups,
+                                   tablebase.solvable_hits, tablebase.dead_hits), file=f)
+
+    if getattr(seeker, 'table', None) is not None:
+        print('Transposition Table: {} probes, {} hits, {} stores, {} entries'.format(
+            seeker.table.probes, seeker.table.hits, seeker.table.stores, len(seeker.table)), file=f)
+
+    if run.solutions is not None:
+        finals = run.finals
+        print('Solutions:', run.solutions, file=f)
+        print('Final Positions: {} {}'.format(bin(finals).count('1'), [
+            divmod(cell, start_board.size) for cell in range(start_board.size ** 2) if finals >> cell & 1]), file=f)
+        if run.solutions_file:
+            print('Solutions File:', run.solutions_file, file=f)
+
+    if getattr(seeker, 'restarted', 0):
+        print('Restarts:', seeker.restarted, file=f)
 
-        print('Duration: {0:.4f} seconds'.format(end - start), file=f)
-        print('Nodes Visited:', seeker.nodes_visited, file=f)
-        print('Space: {} nodes'.format(seeker.space), file=f)
+    for depth, size, seconds in getattr(seeker, 'layer_stats', []):
+        print('Layer {}: {} boards in {:.4f} seconds'.format(depth, size, seconds), file=f)
 
-        if hasattr(seeker, 'visited') and ('graph' in duplication_checks or 'symmetry' in duplication_checks):
-            print('Visited Size:', len(seeker.visited), file=f)
+    for depth, size, seconds in getattr(seeker, 'backward_layer_stats', []):
+        print('Backward layer {}: {} boards in {:.4f} seconds'.format(depth, size, seconds), file=f)
 
-        print("-" * 30, file=f)
+    print("-" * 30, file=f)
+
+
+def main():
+    args = parse_args()
+    analysis.set_cache_size(args.analysis_cache)
+    board_class = BitBoard if args.bitboard else Board
+    # Only mistakes in the input are reported this way; a ValueError from inside a search keeps its traceback
+    try:
+        start_board = board_class.board_from_file(args.input_file)
+        check_args(args, start_board.geometry)
+    except ValueError as error:
+        print(error)
+        return
+
+    stats = instrumentation.Instrumentation() if args.stats else None
+    progress = instrumentation.Progress(args.progress) if args.progress else None
+    with ExitStack() as stack:
+        if stats is not None:
+            stack.enter_context(stats)
+        if args.sample:
+            sampler = stack.enter_context(instrumentation.SamplingProfiler(args.sample_interval))
+        if args.profile:
+            profiler = cProfile.Profile()
+            stack.callback(profiler.dump_stats, args.profile)
+            stack.enter_context(profiler)
+
+        run = solve(args, start_board, progress=progress)
+    if args.sample:
+        sampler.write(args.sample)
+
+    output_file = 'output_files/' + args.input_file.split('/')[-1]
+
+    with open(output_file, 'w') as f:
+        write_report(args, run, f, start_board)
+        if stats is not None:
+            stats.report(f)
         print("Output has been saved to" + output_file)
 
+    if args.results:
+        with open(args.results, 'a') as f:
+            print(json.dumps(results_entry(args, run)), file=f)
+
 
 if __name__ == '__main__':
     main()
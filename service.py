@@ -0,0 +1,135 @@
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import signal
+import socketserver
+import stat
+import sys
+from contextlib import redirect_stderr
+
+import analysis
+import search
+from bitboard import BitBoard
+from board import Board
+
+# Tables kept warm between the jobs a worker process solves (see search.solve)
+_cache = {}
+
+
+def solve_job(line):
+    """
+    Solves one job.
+
+    :param line: a JSON object with 'args', the command line search.py takes as a list of strings, and optionally an
+    'id' to echo back and a 'board' holding the text of a board file to use in place of the input file
+    :return: a JSON object with the id, the steps of the solution (or null), the duration, the nodes visited and the
+    space, or with an 'error'. A job stopped by a budget (see --time-limit) also has 'stopped', the limit it reached,
+    and 'partial', the moves to the board with the fewest pegs it reached
+    """
+    result = {'id': None}
+    try:
+        job = json.loads(line)
+        result['id'] = job.get('id')
+        usage = io.StringIO()
+        try:
+            with redirect_stderr(usage):
+                args = search.parse_args(job['args'])
+        except SystemExit:
+            raise ValueError(usage.getvalue().strip().splitlines()[-1])
+
+        board_class = BitBoard if args.bitboard else Board
+        if 'board' in job:
+            start_board = board_class.board_from_string(job['board'])
+        else:
+            start_board = board_class.board_from_file(args.input_file)
+        run = search.solve(args, start_board, _cache)
+    except Exception as error:
+        # One bad job must not take the worker (or the service) down with it
+        result['error'] = '{}: {}'.format(type(error).__name__, error)
+        return json.dumps(result)
+
+    result['steps'] = [[list(source), list(destination)] for source, destination in run.path] if run.path else None
+    result['duration'] = run.duration
+    result['nodes_visited'] = run.seeker.nodes_visited
+    result['space'] = run.seeker.space
+    if run.solutions is not None:
+        result['solutions'] = run.solutions
+    if run.stopped is not None:
+        result['stopped'] = run.stopped
+        result['partial'] = [[list(source), list(destination)] for source, destination in run.partial]
+    return json.dumps(result)
+
+
+def solve_stream(lines, pool):
+    """
+    Yields the result of every job in lines, in the order they finish.
+    """
+    yield from pool.imap_unordered(solve_job, (line for line in lines if line.strip()))
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        lines = (line.decode('utf-8') for line in self.rfile)
+        for result in solve_stream(lines, self.server.pool):
+            self.wfile.write(result.encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class SolverServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Local socket server: every connection sends jobs as JSON lines and gets results back as they finish. All
+    connections share one pool of worker processes.
+    """
+    daemon_threads = True
+
+    def __init__(self, path, pool):
+        self.pool = pool
+        super().__init__(path, _Handler)
+
+
+def _initialise_worker(analysis_cache):
+    analysis.set_cache_size(analysis_cache)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Solve a stream of peg solitaire boards with a pool of warm workers.')
+    parser.add_argument('jobs', nargs='?', default=None,
+                        help='file of jobs, one JSON object per line (defaults to stdin)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (defaults to the number of CPUs)')
+    parser.add_argument('--socket', default=None,
+                        help='serve jobs on this unix socket instead of reading them from a file or stdin')
+    parser.add_argument('--analysis-cache', type=int, default=analysis.DEFAULT_CACHE_SIZE,
+                        help='number of boards whose legal moves each worker keeps cached')
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    pool = multiprocessing.Pool(args.workers, _initialise_worker, (args.analysis_cache,))
+
+    try:
+        if args.socket:
+            # A socket left behind by a service that did not shut down cleanly would stop the bind
+            if os.path.exists(args.socket) and stat.S_ISSOCK(os.stat(args.socket).st_mode):
+                os.remove(args.socket)
+            # Let a plain kill shut the service down cleanly, removing its socket
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+            with SolverServer(args.socket, pool) as server:
+                try:
+                    server.serve_forever()
+                finally:
+                    os.remove(args.socket)
+        else:
+            jobs = open(args.jobs) if args.jobs else sys.stdin
+            with jobs:
+                for result in solve_stream(jobs, pool):
+                    print(result, flush=True)
+    finally:
+        pool.terminate()
+
+
+if __name__ == '__main__':
+    main()
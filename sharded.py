@@ -0,0 +1,302 @@
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from budget import BudgetExceeded, memory_used
+from paths import Path
+
+# Fibonacci hashing spreads the bitmask keys, whose low bits follow the board's shape, evenly over the shards
+_HASH = np.uint64(0x9E3779B97F4A7C15)
+
+
+def owners(keys, shards):
+    """
+    :return: for each uint64 key, the index of the shard that owns it
+    """
+    return ((keys * _HASH) >> np.uint64(40)) % np.uint64(shards)
+
+
+class _Ring:
+    """
+    A single producer, single consumer ring buffer of uint64 keys in shared memory.
+
+    control holds three counters: the total keys ever written (the head), the total ever read (the tail), and the
+    number of the last layer the producer has finished sending. The producer only ever moves the head and the layer
+    mark and the consumer only the tail, so neither needs a lock. The producer writes the keys before moving the head,
+    and marks a layer finished only after its last keys are in, so a consumer that sees the mark and then reads up to
+    the head has had the whole layer.
+    """
+
+    def __init__(self, keys, control):
+        self.keys = keys
+        self.control = control
+        self.capacity = keys.size
+
+    def write(self, keys):
+        """
+        :return: how many of keys fit, from the front
+        """
+        head, tail = int(self.control[0]), int(self.control[1])
+        count = min(keys.size, self.capacity - (head - tail))
+        start = head % self.capacity
+        first = min(count, self.capacity - start)
+        self.keys[start:start + first] = keys[:first]
+        self.keys[:count - first] = keys[first:count]
+        self.control[0] = head + count
+        return count
+
+    def read(self):
+        """
+        :return: every key written and not yet read
+        """
+        head, tail = int(self.control[0]), int(self.control[1])
+        count = head - tail
+        start = tail % self.capacity
+        first = min(count, self.capacity - start)
+        keys = np.concatenate((self.keys[start:start + first], self.keys[:count - first]))
+        self.control[1] = head
+        return keys
+
+    def finish(self, layer):
+        self.control[2] = layer
+
+    def finished(self, layer):
+        return self.control[2] == layer
+
+
+class ShardedBreadthFirstSearch:
+    """
+    Layered breadth first search spread over worker processes.
+
+    Boards are uint64 bitmasks, as in LayeredBreadthFirstSearch. Every board belongs to one worker, chosen by a hash of
+    its key (its canonical key when checking symmetry), and each worker holds its own shard of every layer, which is
+    all the duplicate checking a layered search needs. To build the next layer each worker expands its shard with
+    numpy, and sends every child to its owner in batches of keys through a ring buffer in shared memory, one per pair
+    of workers, so no boards are ever pickled. While it sends it also drains the buffers addressed to it, so a full
+    buffer never stalls the exchange. The owner merges what it received into its shard of the next layer.
+
+    The workers meet the main process at the end of every layer: it adds up the layer, charges it to the budget and
+    tells them whether to go on. To rebuild the path it asks the owners of candidate parents whether they hold them.
+    """
+
+    def __init__(self, start, check_symmetrical=False, workers=None, ring_size=1 << 16, pruner=None, budget=None):
+        """
+        :param workers: number of worker processes (defaults to the number of CPUs)
+        :param ring_size: keys each ring buffer holds
+        :param budget: a Budget to charge every layer's boards to, between layers
+        """
+        self.start = start
+        self.check_symmetrical = check_symmetrical
+        self.workers = workers or multiprocessing.cpu_count()
+        self.ring_size = ring_size
+        self.pruner = pruner
+        self.budget = budget
+        self.geometry = start.geometry
+        self.layers = []
+        self.layer_stats = []
+        self.nodes_visited = 0
+        self.space = 0
+
+    def search(self):
+        workers = self.workers
+        keys_memory = shared_memory.SharedMemory(create=True, size=workers * workers * self.ring_size * 8)
+        control_memory = shared_memory.SharedMemory(create=True, size=workers * workers * 3 * 8)
+        np.ndarray((workers * workers * 3,), dtype=np.uint64, buffer=control_memory.buf)[:] = 0
+
+        connections = []
+        processes = []
+        try:
+            for shard in range(workers):
+                connection, worker_connection = multiprocessing.Pipe()
+                process = multiprocessing.Process(
+                    target=_sharded_worker,
+                    args=(worker_connection, shard, workers, self.ring_size, keys_memory.name, control_memory.name,
+                          self.geometry, self._key(self.start.pegs), self.check_symmetrical, self.pruner))
+                process.start()
+                connections.append(connection)
+                processes.append(process)
+
+            layer_start = time.time()
+            while True:
+                reports = [connection.recv() for connection in connections]
+                size = sum(report[0] for report in reports)
+                if self.pruner is not None:
+                    # The workers prune with their own copies of the pruner, so their counts are added up here
+                    self.pruner.checked += sum(checked for _, _, _, (checked, _), _ in reports)
+                    self.pruner.pruned += sum(pruned for _, _, _, (_, pruned), _ in reports)
+                self.layers.append(size)
+                self.nodes_visited += size
+                self.space = max(self.space, size)
+                self.layer_stats.append((len(self.layers) - 1, size, time.time() - layer_start))
+
+                goals = [goal for _, goal, _, _, _ in reports if goal is not None]
+                if goals:
+                    return self._path_to(goals[0], connections)
+                if not size:
+                    return None
+                if self.budget is not None:
+                    # The workers hold the layers, so their memory counts against the budget's ceiling
+                    self.budget.outside_memory = sum(report[4] for report in reports)
+                    try:
+                        self.budget.charge(nodes=size)
+                    except BudgetExceeded:
+                        sample = next(sample for _, _, sample, _, _ in reports if sample is not None)
+                        if len(self.layers) - 1 > len(self.budget.best):
+                            self.budget.best = Path.from_moves(self._path_to(sample, connections))
+                        raise
+
+                layer_start = time.time()
+                for connection in connections:
+                    connection.send(('expand', len(self.layers)))
+        finally:
+            for connection in connections:
+                connection.send(('stop',))
+            for process in processes:
+                process.join()
+            for memory in (keys_memory, control_memory):
+                memory.close()
+                memory.unlink()
+
+    def _key(self, pegs):
+        return self.geometry.canonical(pegs) if self.check_symmetrical else pegs
+
+    def _path_to(self, goal, connections):
+        """
+        Rebuilds the path to a board of the last layer, as LayeredBreadthFirstSearch._path_to does, asking the owners
+        of each candidate parent whether their shard of the layer before holds it.
+        """
+        jumps = self.geometry.jumps
+        keys = [goal]
+        for depth in range(len(self.layers) - 2, -1, -1):
+            parents = np.array([self._key(keys[-1] ^ jumps[index][1])
+                                for index in self.geometry.reverse_jumps(keys[-1])], dtype=np.uint64)
+            held = np.zeros(parents.size, dtype=bool)
+            parent_owners = owners(parents, self.workers)
+            for shard in np.unique(parent_owners):
+                mine = parent_owners == shard
+                connections[shard].send(('contains', depth, parents[mine]))
+                held[mine] = connections[shard].recv()
+            keys.append(int(parents[np.argmax(held)]))
+
+        path = []
+        pegs = self.start.pegs
+        for key in reversed(keys[:-1]):
+            for index in self.geometry.legal_jumps(pegs):
+                move, jump_mask, _, _ = jumps[index]
+                if self._key(pegs ^ jump_mask) == key:
+                    path.append(move)
+                    pegs ^= jump_mask
+                    break
+        return path
+
+
+def _sharded_worker(connection, shard, workers, ring_size, keys_name, control_name, geometry, start, check_symmetrical,
+                    pruner):
+    """
+    Holds one shard of every layer of a ShardedBreadthFirstSearch and carries out the main process's requests: expand
+    the newest layer, answer whether keys are in a layer, or stop.
+    """
+    keys_memory = shared_memory.SharedMemory(keys_name)
+    control_memory = shared_memory.SharedMemory(control_name)
+    try:
+        ring_keys = np.ndarray((workers, workers, ring_size), dtype=np.uint64, buffer=keys_memory.buf)
+        control = np.ndarray((workers, workers, 3), dtype=np.uint64, buffer=control_memory.buf)
+        # Ring [i, j] carries keys from worker i to worker j
+        outgoing = [_Ring(ring_keys[shard, other], control[shard, other]) for other in range(workers)]
+        incoming = [_Ring(ring_keys[other, shard], control[other, shard]) for other in range(workers)]
+        jump_arrays = geometry.jump_arrays()
+
+        start = np.array([start], dtype=np.uint64)
+        layers = [start if owners(start, workers)[0] == shard else np.empty(0, dtype=np.uint64)]
+        _report(connection, layers[-1], (0, 0))
+        while True:
+            request = connection.recv()
+            if request[0] == 'expand':
+                children = _children(layers[-1], jump_arrays, geometry, check_symmetrical)
+                layer = _exchange(children, request[1], shard, workers, outgoing, incoming)
+                counts = (0, 0)
+                if pruner is not None:
+                    checked, pruned = pruner.checked, pruner.pruned
+                    layer = layer[pruner.viable_array(layer)]
+                    counts = (pruner.checked - checked, pruner.pruned - pruned)
+                layers.append(layer)
+                _report(connection, layer, counts)
+            elif request[0] == 'contains':
+                layer, keys = layers[request[1]], request[2]
+                positions = np.minimum(np.searchsorted(layer, keys), max(layer.size - 1, 0))
+                connection.send(layer[positions] == keys if layer.size else np.zeros(keys.size, dtype=bool))
+            else:
+                return
+    finally:
+        # Shared memory cannot be closed while arrays still point into it
+        ring_keys = control = outgoing = incoming = None
+        keys_memory.close()
+        control_memory.close()
+
+
+def _report(connection, layer, counts):
+    """
+    Sends the main process the size of the worker's shard of a layer, a goal in it if there is one, a sample board
+    from it, the (checked, pruned) counts of the pruning that made it, and the worker's memory use in bytes.
+    """
+    goals = layer[(layer != 0) & ((layer & (layer - np.uint64(1))) == 0)]
+    connection.send((int(layer.size), int(goals[0]) if goals.size else None, int(layer[0]) if layer.size else None,
+                     counts, memory_used()))
+
+
+def _children(layer, jump_arrays, geometry, check_symmetrical):
+    """
+    :return: the sorted, unique keys of every board one jump away from a board in layer
+    """
+    children = []
+    for jump_needed, jump_destination, jump_mask in zip(*jump_arrays):
+        movable = layer[((layer & jump_needed) == jump_needed) & ((layer & jump_destination) == 0)]
+        if movable.size:
+            children.append(movable ^ jump_mask)
+    children = np.concatenate(children) if children else np.empty(0, dtype=np.uint64)
+    if check_symmetrical:
+        children = geometry.canonical_array(children)
+    return np.unique(children)
+
+
+def _exchange(children, layer_number, shard, workers, outgoing, incoming):
+    """
+    Sends every child to its owner and collects the children the other workers send here.
+
+    :return: this worker's shard of the next layer
+    """
+    child_owners = owners(children, workers)
+    batches = [children[child_owners == other] for other in range(workers)]
+    received = [batches[shard]]
+    sending = {other for other in range(workers) if other != shard}
+    receiving = set(sending)
+    for other in list(sending):
+        if not batches[other].size:
+            outgoing[other].finish(layer_number)
+            sending.discard(other)
+
+    while sending or receiving:
+        moved = False
+        for other in list(sending):
+            count = outgoing[other].write(batches[other])
+            if count:
+                batches[other] = batches[other][count:]
+                moved = True
+            if not batches[other].size:
+                outgoing[other].finish(layer_number)
+                sending.discard(other)
+        for other in list(receiving):
+            # Checked before reading, so that everything up to the mark is in the buffer by the time it is read
+            finished = incoming[other].finished(layer_number)
+            keys = incoming[other].read()
+            if keys.size:
+                received.append(keys)
+                moved = True
+            if finished:
+                receiving.discard(other)
+        if not moved:
+            time.sleep(0.0001)
+
+    return np.unique(np.concatenate(received))
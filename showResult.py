@@ -1,69 +1,166 @@
-from board import Board, Spot
-from matplotlib import animation, pyplot as plt
-import numpy as np
-
-# filename = 'input_files/ortho.txt'
-filename = input('Please enter your input file name: ')
-board = Board.board_from_file(filename)
-
-result = []
-result_filename = 'output_files/' + filename.split('/')[-1]
-with open(result_filename, 'r') as f:
-    lines = f.readlines()
-    for i in range(len(lines)):
-        if lines[i].startswith('Steps:'):
-            steps = int(lines[i].split()[1])
-            result = lines[i+1:i+1+steps]
-            break
-
-
-moves = []
-for line in result:
-    # print(line)
-    start, end = line.strip().split(' --> ')
-    start = tuple(map(int, start[1:-1].split(', ')))
-    end = tuple(map(int, end[1:-1].split(', ')))
-    moves.append((start, end))
-
-def MySquare(x, y, color):
-    return plt.Rectangle((x + 0.05, y + 0.05), 0.9, 0.9, color=color)
-
-def addSquare(x, y, color, ax):
-    ax.add_patch(MySquare(x, y, color))
-
-def InitBoard(board, ax):
-    for x in range(board.size):
-        for y in range(board.size):
-            if board.board[x, y] == Spot.PEG:
-                addSquare(board.size - y, board.size - x, 'blue', ax)
-            elif board.board[x, y] == Spot.FREE:
-                addSquare(board.size - y, board.size - x, 'white', ax)
-            else:
-                addSquare(board.size - y, board.size - x, 'black', ax)
-
-def moveUpdateSqaure(board, move, ax):
-    start, end = move
-    hop = tuple(np.array(np.divide(np.add(start, end), (2, 2)), dtype=np.int32))
-    addSquare(board.size - start[1], board.size - start[0], 'white', ax)
-    addSquare(board.size - hop[1], board.size - hop[0], 'white', ax)
-    addSquare(board.size - end[1], board.size - end[0], 'blue', ax)
-
-fig1 = plt.figure(figsize=(8, 8))
-plt.ion()
-ax1 = fig1.add_subplot(111)
-ax1.set_xlim(0, 10)
-ax1.set_ylim(0, 10)
-
-# plt.show()
-
-def update(i, board, moves, ax):
-    if i == 0:
-        InitBoard(board, ax1) 
-    moveUpdateSqaure(board, moves[i], ax)
-
-anime =animation.FuncAnimation(fig1, update, frames=len(moves), fargs=(board, moves, ax1), interval=1000)
-anime_filename = 'animations/' + filename.split('/')[-1].split('.')[0] + '.html'
-with open(anime_filename, "w") as f:
-    print(anime.to_jshtml(), file=f)
-
-print('Animation file has saved to ' + anime_filename + '.')
\ No newline at end of file
+import argparse
+import json
+import multiprocessing
+import os
+
+from geometry import Geometry, load_board, parse_board
+
+# Colours of a cell holding a peg, an empty cell and a cell off the board
+COLOURS = {'peg': 'blue', 'free': 'white', 'out': 'black'}
+
+
+def read_results(file_name):
+    """
+    :param file_name: a results file as written by search.py --results, one JSON object per line
+    :return: every entry in it that has a solution
+    """
+    with open(file_name) as f:
+        return [entry for entry in (json.loads(line) for line in f if line.strip()) if entry.get('steps')]
+
+
+def frames(geometry, pegs, steps):
+    """
+    :return: (start, changes): the state ('peg', 'free' or 'out') of every cell at the start, and for every move the
+    list of (cell, state) it changes, which is all that differs between one frame and the next
+    """
+    size = geometry.size
+    start = ['out'] * (size * size)
+    for cell in range(size * size):
+        if pegs >> cell & 1:
+            start[cell] = 'peg'
+        elif geometry.cells >> cell & 1:
+            start[cell] = 'free'
+
+    changes = []
+    for (source_r, source_c), (destination_r, destination_c) in steps:
+        hop = (source_r + destination_r) // 2 * size + (source_c + destination_c) // 2
+        changes.append([(source_r * size + source_c, 'free'), (hop, 'free'),
+                        (destination_r * size + destination_c, 'peg')])
+    return start, changes
+
+
+def render_svg(size, start, changes, seconds=1.0):
+    """
+    :return: an animated SVG of the solution: one square per cell, and for each cell a fill change at the time of
+    every move that touches it, so its size grows with the board and the number of moves, not with their product
+    """
+    timeline = [[] for _ in range(size * size)]
+    for frame, change in enumerate(changes, 1):
+        for cell, state in change:
+            timeline[cell].append((frame * seconds, state))
+
+    lines = ['<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {0} {0}" width="{1}" height="{1}">'.format(
+        size, 48 * size), '<rect width="{0}" height="{0}" fill="{1}"/>'.format(size, COLOURS['out'])]
+    for cell, state in enumerate(start):
+        if state == 'out':
+            continue
+        r, c = divmod(cell, size)
+        square = '<rect x="{}.05" y="{}.05" width="0.9" height="0.9" fill="{}"'.format(c, r, COLOURS[state])
+        if not timeline[cell]:
+            lines.append(square + '/>')
+            continue
+        lines.append(square + '>')
+        for begin, state in timeline[cell]:
+            lines.append('<set attributeName="fill" to="{}" begin="{:g}s" fill="freeze"/>'.format(
+                COLOURS[state], begin))
+        lines.append('</rect>')
+    lines.append('</svg>')
+    return '\n'.join(lines)
+
+
+def render_html(size, start, changes, seconds=1.0):
+    """
+    :return: a matplotlib animation of the solution as a standalone HTML page. Every cell gets its square once, and
+    each frame only recolours the squares its move changes.
+    """
+    # Imported here, headless, so that runs writing SVG never load matplotlib
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import animation, pyplot as plt
+
+    figure = plt.figure(figsize=(0.5 * size, 0.5 * size), dpi=72)
+    axes = figure.add_axes((0, 0, 1, 1))
+    axes.set_xlim(0, size)
+    axes.set_ylim(0, size)
+    axes.set_axis_off()
+    axes.add_patch(plt.Rectangle((0, 0), size, size, color=COLOURS['out']))
+    squares = {}
+    for cell, state in enumerate(start):
+        if state != 'out':
+            r, c = divmod(cell, size)
+            squares[cell] = plt.Rectangle((c + 0.05, size - 1 - r + 0.05), 0.9, 0.9, color=COLOURS[state])
+            axes.add_patch(squares[cell])
+
+    # Frame 0 is the start and frame i the board after move i, so a replay from frame 0 puts the start back
+    restart = [(cell, state) for cell, state in enumerate(start) if state != 'out']
+
+    def update(frame):
+        changed = changes[frame - 1] if frame else restart
+        for cell, state in changed:
+            squares[cell].set_color(COLOURS[state])
+        return [squares[cell] for cell, _ in changed]
+
+    anime = animation.FuncAnimation(figure, update, frames=len(changes) + 1, interval=1000 * seconds, blit=True)
+    try:
+        return anime.to_jshtml(default_mode='once')
+    finally:
+        plt.close(figure)
+
+
+RENDERERS = {'svg': render_svg, 'html': render_html}
+
+
+def render(entry, output_file, output_format='svg', seconds=1.0):
+    """
+    Animates one solved board.
+
+    :param entry: a results entry: the 'steps' of the solution and the 'input_file' it solves, or the text of the
+    board itself as 'board'
+    :return: output_file
+    """
+    if 'board' in entry:
+        size, cells, pegs, directions = parse_board(entry['board'])
+        geometry = Geometry.get(size, cells, directions)
+    else:
+        geometry, pegs = load_board(entry['input_file'])
+    start, changes = frames(geometry, pegs, entry['steps'])
+    with open(output_file, 'w') as f:
+        f.write(RENDERERS[output_format](geometry.size, start, changes, seconds))
+    return output_file
+
+
+def _render_job(job):
+    return render(*job)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Animate the solutions in results files written by search.py '
+                                                 '--results.')
+    parser.add_argument('results', nargs='+', help='results files, eg output_files/results.jsonl')
+    parser.add_argument('--format', choices=sorted(RENDERERS), default='svg',
+                        help='an animated SVG, or an HTML page of matplotlib frames')
+    parser.add_argument('--output-dir', default='animations', help='directory to write the animations to')
+    parser.add_argument('--seconds', type=float, default=1.0, help='seconds each move is shown for')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (defaults to the number of CPUs)')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = []
+    for results_file in args.results:
+        for entry in read_results(results_file):
+            name = os.path.splitext(os.path.basename(entry.get('input_file') or str(entry.get('id', 'board'))))[0]
+            output_file = os.path.join(args.output_dir, '{}-{}.{}'.format(name, len(jobs), args.format))
+            jobs.append((entry, output_file, args.format, args.seconds))
+
+    if len(jobs) > 1 and args.workers != 1:
+        with multiprocessing.Pool(args.workers) as pool:
+            for output_file in pool.imap_unordered(_render_job, jobs):
+                print('Animation file has saved to ' + output_file + '.')
+    else:
+        for job in jobs:
+            print('Animation file has saved to ' + _render_job(job) + '.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import time
+
+from database import DEAD, SOLVABLE, UNKNOWN
+from lazy import lazy_import
+
+np = lazy_import('numpy')
+
+
+class Tablebase:
+    """
+    Every board with at most max_pegs pegs that can still be reduced to a single peg, built backwards from the goals.
+
+    The first layer is the one-peg board on every playable cell. Each further layer applies every jump in reverse
+    (a peg on the destination, the source and the jumped cell empty) to the whole of the layer before it, so it holds
+    exactly the solvable boards with one more peg. Boards are stored by canonical bitmask in one sorted uint64 array.
+
+    Lookups have the same interface as PositionDatabase: a board with few enough pegs is either in the table, and
+    solved by always jumping to a child that is also in the table, or dead.
+    """
+
+    def __init__(self, geometry, max_pegs):
+        self.geometry = geometry
+        self.max_pegs = max_pegs
+        self.lookups = 0
+        self.solvable_hits = 0
+        self.dead_hits = 0
+
+        build_start = time.time()
+        needed, destination, mask = geometry.jump_arrays()
+        layer = geometry.canonical_array(np.array([1 << cell for cell in range(geometry.size * geometry.size)
+                                                   if geometry.cells >> cell & 1], dtype=np.uint64))
+        layers = [np.unique(layer)]
+        for _ in range(1, max_pegs):
+            layer = layers[-1]
+            parents = [layer[((layer & jump_destination) != 0) & ((layer & jump_needed) == 0)] ^ jump_mask
+                       for jump_needed, jump_destination, jump_mask in zip(needed, destination, mask)]
+            layer = np.unique(geometry.canonical_array(np.concatenate(parents)))
+            if not layer.size:
+                break
+            layers.append(layer)
+
+        self.layer_sizes = [layer.size for layer in layers]
+        self.keys = np.sort(np.concatenate(layers))
+        self.build_time = time.time() - build_start
+
+    def __contains__(self, pegs):
+        key = np.uint64(self.geometry.canonical(pegs))
+        position = np.searchsorted(self.keys, key)
+        return position < self.keys.size and self.keys[position] == key
+
+    def contains_array(self, keys):
+        """
+        Vectorised membership: maps a uint64 array of canonical bitmasks to a boolean array.
+        """
+        positions = np.minimum(np.searchsorted(self.keys, keys), self.keys.size - 1)
+        return self.keys[positions] == keys
+
+    def lookup(self, board):
+        """
+        :return: (status, moves), where moves is a line of play from board to a goal when status is SOLVABLE; boards
+        with more than max_pegs pegs are UNKNOWN
+        """
+        pegs = board.pegs
+        if bin(pegs).count('1') > self.max_pegs:
+            return UNKNOWN, None
+
+        self.lookups += 1
+        if pegs not in self:
+            self.dead_hits += 1
+            return DEAD, None
+
+        geometry = self.geometry
+        moves = []
+        while pegs & (pegs - 1):
+            for index in geometry.legal_jumps(pegs):
+                move, jump_mask, _, _ = geometry.jumps[index]
+                if pegs ^ jump_mask in self:
+                    moves.append(move)
+                    pegs ^= jump_mask
+                    break
+        self.solvable_hits += 1
+        return SOLVABLE, moves
+
+    def __len__(self):
+        return int(self.keys.size)
@@ -0,0 +1,25 @@
+import itertools
+import os
+
+from database import BUCKET_SLOTS, DEAD, PositionDatabase
+from geometry import load_board
+
+INPUTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'input_files')
+
+
+def test_keys_differing_in_high_cells_spread_across_buckets(tmp_path):
+    geometry, pegs = load_board(os.path.join(INPUTS, 'size7.txt'))
+    database = PositionDatabase(str(tmp_path), geometry, size_mb=1)
+    low = pegs & ((1 << 19) - 1)
+    high = [1 << cell for cell in range(19, geometry.size * geometry.size) if geometry.cells >> cell & 1]
+    keys = [low | sum(cells) for cells in itertools.combinations(high, 4)]
+
+    for key in keys:
+        database._put(key, DEAD, 0)
+
+    buckets = {database._bucket(key)[0] for key in keys}
+    assert len(buckets) > len(keys) // 2
+    assert len(database) == len(keys)
+    assert all(database._get(key) == (DEAD, 0) for key in keys)
+    assert database.slots // BUCKET_SLOTS == 1 << database.bucket_bits
+    database.close()
@@ -0,0 +1,23 @@
+import os
+
+from bitboard import BitBoard
+from geometry import load_board
+from hints import HintEngine
+
+INPUTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'input_files')
+
+
+def test_every_move_gets_a_count_once_the_engine_finishes():
+    geometry, _ = load_board(os.path.join(INPUTS, 'size5.txt'))
+    # Reachable from the size5 start, solvable, and one of its moves leaves a board the pruner rejects
+    board = BitBoard(geometry, 69648)
+    engine = HintEngine(board, prune=True)
+    try:
+        solutions, moves = engine.hints(board, wait=60)
+        assert engine.done == board.pegs
+        assert solutions
+        assert moves
+        assert all(move_solutions is not None for _, move_solutions in moves)
+        assert engine.counter.pruner.pruned
+    finally:
+        engine.close()
@@ -0,0 +1,57 @@
+class TranspositionTable:
+    """
+    Fixed size table of lower bounds on the cost still to pay from a board, for iterative deepening searches.
+
+    Entries are keyed by canonical board key and kept in two-slot buckets. The first slot holds the entry with the most
+    weight (pegs on the board, so the largest subtree) seen in the bucket; the second always takes the newest entry, and
+    an entry pushed out of the first slot moves down to it. Memory use never grows past the size given.
+    """
+
+    def __init__(self, size=1 << 20):
+        """
+        :param size: the number of entries to hold
+        """
+        self.buckets = max(1, size // 2)
+        self.keys = [None] * (2 * self.buckets)
+        self.bounds = [0] * (2 * self.buckets)
+        self.weights = [0] * (2 * self.buckets)
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def get(self, key):
+        """
+        :return: the stored lower bound for key, or 0 if there is none
+        """
+        self.probes += 1
+        slot = self._slot(key)
+        for i in (slot, slot + 1):
+            if self.keys[i] == key:
+                self.hits += 1
+                return self.bounds[i]
+        return 0
+
+    def store(self, key, bound, weight):
+        self.stores += 1
+        slot = self._slot(key)
+        for i in (slot, slot + 1):
+            if self.keys[i] == key:
+                self.bounds[i] = max(self.bounds[i], bound)
+                self.weights[i] = max(self.weights[i], weight)
+                return
+
+        if weight >= self.weights[slot]:
+            self.keys[slot + 1] = self.keys[slot]
+            self.bounds[slot + 1] = self.bounds[slot]
+            self.weights[slot + 1] = self.weights[slot]
+        else:
+            slot += 1
+        self.keys[slot] = key
+        self.bounds[slot] = bound
+        self.weights[slot] = weight
+
+    def _slot(self, key):
+        return 2 * ((key * 0x9E3779B97F4A7C15 >> 32) % self.buckets)
+
+    def __len__(self):
+        return sum(key is not None for key in self.keys)
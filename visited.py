@@ -0,0 +1,149 @@
+import math
+
+
+class VisitedSet:
+    """
+    Hash based record of the boards a graph search has already generated.
+
+    Boards are stored by integer key rather than by value, so checking a board is a single set lookup. When symmetry
+    checking is on the key is the board's canonical key, so one entry stands for every reflection and rotation of it.
+    """
+
+    def __init__(self, check_symmetrical=False):
+        self.check_symmetrical = check_symmetrical
+        self.keys = set()
+
+    def key(self, board):
+        return board.canonical_key() if self.check_symmetrical else board.key()
+
+    def visit(self, board):
+        """
+        Records a board as visited.
+        :return: True if the board (or a symmetric equivalent) had not been visited before
+        """
+        key = self.key(board)
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        return True
+
+    def __contains__(self, board):
+        return self.key(board) in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+
+# Keys of boards with more than 64 cells are folded into 64 bits before hashing
+_MASK = (1 << 64) - 1
+
+
+class BloomVisitedSet:
+    """
+    Approximate record of the boards a graph search has already generated, in a fixed amount of memory.
+
+    Keys go into a Bloom filter: a bit array sized from a memory budget, in which each key sets a handful of bits
+    chosen by hashing it. A key whose bits are all set is taken as visited, so a new board can now and then be mistaken
+    for an old one and pruned, never the other way round. That can lose solutions, but the filter never grows, so the
+    search can run on spaces whose exact visited set would not fit in memory.
+
+    The filter is sized so that once it holds capacity keys the chance of such a false positive is
+    false_positive_rate; it keeps working past that, only less accurately. Each board added is charged the chance that
+    a new board arriving at that fill would have been taken for a visited one, which adds up to an estimate of how many
+    boards were pruned by mistake.
+
+    With exact_depth, boards fewer than that many moves from the start are kept in an exact set instead (every jump
+    removes one peg, so a key's depth is the number of pegs missing from it). Losing a shallow board would cut off a
+    large part of the tree, and there are few of them, so they are worth keeping exactly.
+    """
+
+    def __init__(self, memory_budget, false_positive_rate=0.001, check_symmetrical=False, exact_depth=0,
+                 start_pegs=0):
+        """
+        :param memory_budget: bytes of memory for the filter's bits
+        :param false_positive_rate: the chance of a false positive once the filter is full
+        :param exact_depth: keep boards fewer than this many moves from the start in an exact set
+        :param start_pegs: the peg count of the start board, from which depths are counted
+        """
+        self.check_symmetrical = check_symmetrical
+        self.false_positive_rate = false_positive_rate
+        self.exact_depth = exact_depth
+        self.start_pegs = start_pegs
+        self.size = max(64, int(memory_budget) * 8)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.capacity = max(1, int(self.size * math.log(2) ** 2 / -math.log(false_positive_rate)))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.keys = set()
+        self.added = 0
+        self.rejected = 0
+        self.false_positives = 0.0
+
+    @property
+    def mode(self):
+        return 'hybrid' if self.exact_depth else 'bloom'
+
+    def key(self, board):
+        return board.canonical_key() if self.check_symmetrical else board.key()
+
+    def visit(self, board):
+        """
+        Records a board as visited.
+        :return: True if the board (or a symmetric equivalent) had not been visited before, as far as the filter can
+        tell
+        """
+        key = self.key(board)
+        if self.exact_depth and self.start_pegs - bin(key).count('1') < self.exact_depth:
+            if key in self.keys:
+                return False
+            self.keys.add(key)
+            return True
+
+        missing = self._missing(key)
+        if not missing:
+            self.rejected += 1
+            return False
+
+        rate = self.current_rate()
+        if rate < 1:
+            # Of the new boards that arrived at this fill, this one got through and a rate share of them did not
+            self.false_positives += rate / (1 - rate)
+        bits = self.bits
+        for position in missing:
+            bits[position >> 3] |= 1 << (position & 7)
+        self.added += 1
+        return True
+
+    def current_rate(self):
+        """
+        :return: the estimated chance that a board not yet visited is taken for a visited one at the filter's fill now
+        """
+        return (1 - math.exp(-self.hashes * self.added / self.size)) ** self.hashes
+
+    def _missing(self, key):
+        """
+        :return: the positions of the key's bits that are not set yet
+        """
+        # The splitmix64 finaliser spreads the key over 64 bits, which give the first position and the step between
+        # positions (double hashing)
+        z = (key ^ (key >> 64)) & _MASK
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK
+        size = self.size
+        bits = self.bits
+        position = (z ^ (z >> 31)) % size
+        step = (z >> 33) | 1
+        missing = []
+        for _ in range(self.hashes):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                missing.append(position)
+            position = (position + step) % size
+        return missing
+
+    def __contains__(self, board):
+        key = self.key(board)
+        if self.exact_depth and self.start_pegs - bin(key).count('1') < self.exact_depth:
+            return key in self.keys
+        return not self._missing(key)
+
+    def __len__(self):
+        return len(self.keys) + self.added